@@ -5,6 +5,12 @@ __all__ = [
 	"ast_nodes",
 	"symbols",
 	"codegen",
+	"tailrec",
+	"callgraph",
+	"switchlower",
+	"ipcp",
+	"profile",
+	"linker",
 	"cli",
 ]
 
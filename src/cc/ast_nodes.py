@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Optional, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 
 # Types
@@ -28,7 +28,32 @@ class FunctionDecl:
 	return_type: Type
 	name: str
 	params: List[Param]
-	body: "Block"
+	body: Optional["Block"]  # None for a prototype / extern declaration
+	internal: bool = False  # compiler-made (e.g. ipcp clones), not visible to other units
+
+
+# Function from Parser(lazy=True): only the signature is parsed up front and
+# `load` parses the skimmed body tokens the first time `body` is read.
+class LazyFunctionDecl(FunctionDecl):
+	def __init__(self, return_type: Type, name: str, params: List[Param], load: Callable[[], "Block"]) -> None:
+		super().__init__(return_type, name, params, None)
+		self._load: Optional[Callable[[], Block]] = load
+
+	@property
+	def parsed(self) -> bool:
+		return self._load is None
+
+	@property  # type: ignore[override]
+	def body(self) -> Optional["Block"]:
+		if self._load is not None:
+			self._body = self._load()
+			self._load = None
+		return self._body
+
+	@body.setter
+	def body(self, value: Optional["Block"]) -> None:
+		self._body = value
+		self._load = None
 
 
 # Statements
@@ -60,7 +85,22 @@ class ExprStmt:
 	expr: Optional["Expr"]
 
 
-Stmt = Union[IfStmt, WhileStmt, ReturnStmt, ExprStmt, VarDecl]
+# Self tail call rewritten by tailrec: reassign the parameters and jump back
+# to the top of the function instead of calling it.
+@dataclass
+class TailJump:
+	args: List["Expr"]
+
+
+# if/else-if chain on one variable, produced by switchlower
+@dataclass
+class SwitchStmt:
+	subject: "Var"
+	cases: List[Tuple[int, Block]]
+	default: Optional[Block]
+
+
+Stmt = Union[IfStmt, WhileStmt, ReturnStmt, ExprStmt, VarDecl, TailJump, SwitchStmt]
 
 
 # Expressions
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, Iterator, List, Set
+
+from .ast_nodes import *  # noqa: F401,F403
+
+
+def iter_calls(block: Block) -> Iterator[Call]:
+	for st in block.statements:
+		if isinstance(st, ExprStmt) and st.expr is not None:
+			yield from _expr_calls(st.expr)
+		elif isinstance(st, ReturnStmt) and st.value is not None:
+			yield from _expr_calls(st.value)
+		elif isinstance(st, IfStmt):
+			yield from _expr_calls(st.cond)
+			yield from iter_calls(st.then_block)
+			if st.else_block:
+				yield from iter_calls(st.else_block)
+		elif isinstance(st, WhileStmt):
+			yield from _expr_calls(st.cond)
+			yield from iter_calls(st.body)
+		elif isinstance(st, SwitchStmt):
+			for _, b in st.cases:
+				yield from iter_calls(b)
+			if st.default:
+				yield from iter_calls(st.default)
+		elif isinstance(st, TailJump):
+			for a in st.args:
+				yield from _expr_calls(a)
+
+
+def _expr_calls(e: Expr) -> Iterator[Call]:
+	if isinstance(e, Call):
+		yield e
+		for a in e.args:
+			yield from _expr_calls(a)
+	elif isinstance(e, Assign):
+		yield from _expr_calls(e.value)
+	elif isinstance(e, Binary):
+		yield from _expr_calls(e.left)
+		yield from _expr_calls(e.right)
+	elif isinstance(e, Unary):
+		yield from _expr_calls(e.value)
+
+
+def call_graph(functions: List[FunctionDecl]) -> Dict[str, Set[str]]:
+	# callee names per defined function, builtins and externs included
+	return {fn.name: {c.name for c in iter_calls(fn.body)} for fn in functions if fn.body is not None}
+
+
+def reachable(functions: List[FunctionDecl], roots: Iterable[str] = ("main",)) -> List[FunctionDecl]:
+	# functions (and prototypes) reachable from `roots`, in source order. Only
+	# the bodies of reached functions are read, so lazily parsed functions
+	# that are never called stay unparsed.
+	by_name: Dict[str, FunctionDecl] = {}
+	for fn in functions:
+		if fn.name not in by_name or isinstance(fn, LazyFunctionDecl) or fn.body is not None:
+			by_name[fn.name] = fn
+	stack = list(roots)
+	unknown = [name for name in stack if name not in by_name]
+	if unknown:
+		raise ValueError("Unknown root function(s): " + ", ".join(unknown))
+	seen: Set[str] = set()
+	while stack:
+		name = stack.pop()
+		if name in seen:
+			continue
+		seen.add(name)
+		body = by_name[name].body
+		if body is not None:
+			stack.extend(c.name for c in iter_calls(body) if c.name in by_name)
+	return [fn for fn in functions if fn.name in seen]
@@ -1,33 +1,167 @@
 from __future__ import annotations
 
 import argparse
+import sys
+from dataclasses import dataclass
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 from .lexer import Lexer
 from .parser import Parser
+from .callgraph import reachable
 from .codegen import Codegen
+from .ipcp import IPCPStats, propagate_constants
+from .linker import link_modules, parse_module
+from .profile import DEFAULT_PROFILE_PATH, load_profile
+from .switchlower import lower_switches
+from .tailrec import eliminate_tail_recursion
 
 
-def compile_to_ll(source_path: Path, out_path: Path) -> None:
+@dataclass
+class CompileResult:
+	codegen: Codegen
+	ipcp: Optional[IPCPStats] = None
+	# (kept, total) function counts when compiling only what roots reach
+	reachable: Optional[Tuple[int, int]] = None
+
+
+def compile_to_ll(
+	source_path: Path,
+	out_path: Path,
+	tre: bool = False,
+	tail_calls: bool = False,
+	lvn: bool = False,
+	switch_threshold: Optional[int] = None,
+	profile_generate: Optional[str] = None,
+	profile_use: Optional[Path] = None,
+	print_mode: str = "buffered",
+	ipcp: bool = False,
+	roots: Optional[List[str]] = None,
+) -> CompileResult:
 	src = source_path.read_text(encoding="utf-8")
 	lex = Lexer(src)
-	tokens = lex.tokenize()
-	parser = Parser(tokens)
+	# with roots, bodies are tokenized and parsed only for the functions
+	# they reach
+	tokens = lex.tokenize(skim_bodies=roots is not None)
+	parser = Parser(tokens, lazy=roots is not None)
 	funcs = parser.parse()
-	ll = Codegen().generate(funcs)
+	kept = None
+	if roots is not None:
+		total = len(funcs)
+		funcs = reachable(funcs, roots)
+		kept = (len(funcs), total)
+	profile = load_profile(profile_use) if profile_use is not None else None
+	stats = propagate_constants(funcs, profile) if ipcp else None
+	if switch_threshold is not None:
+		lower_switches(funcs, switch_threshold)
+	if tre:
+		eliminate_tail_recursion(funcs)
+	cg = Codegen(
+		tail_calls=tail_calls,
+		lvn=lvn,
+		profile_generate=profile_generate,
+		profile=profile,
+		print_mode=print_mode,
+	)
+	ll = cg.generate(funcs)
 	out_path.write_text(ll, encoding="utf-8")
+	return CompileResult(cg, stats, kept)
+
+
+def link_files(inputs: List[Path], out_path: Path) -> None:
+	modules = [parse_module(str(p), p.read_text(encoding="utf-8")) for p in inputs]
+	out_path.write_text(link_modules(modules), encoding="utf-8")
+
+
+def link_main(argv: List[str]) -> None:
+	ap = argparse.ArgumentParser(prog="ccmini link", description="Merge LLVM IR modules into one")
+	ap.add_argument("inputs", type=Path, nargs="+", help="Input .ll files")
+	ap.add_argument("-o", "--output", type=Path, required=True, help="Output .ll file")
+	args = ap.parse_args(argv)
+	try:
+		link_files(args.inputs, args.output)
+	except ValueError as err:
+		# LinkError, or a line parse_module does not understand
+		raise SystemExit(f"link failed: {err}")
+	print(f"Wrote {args.output}")
 
 
-def main() -> None:
+def main(argv: Optional[List[str]] = None) -> None:
+	argv = sys.argv[1:] if argv is None else argv
+	if argv and argv[0] == "link":
+		link_main(argv[1:])
+		return
 	ap = argparse.ArgumentParser(description="C-subset to LLVM IR compiler")
 	ap.add_argument("input", type=Path, help="Input .c file")
 	ap.add_argument("-o", "--output", type=Path, help="Output .ll file")
-	args = ap.parse_args()
+	ap.add_argument("--tre", action="store_true", help="Turn self tail calls into loops")
+	ap.add_argument("--tail-calls", action="store_true", help="Mark remaining calls as `tail` in the IR")
+	ap.add_argument("--lvn", action="store_true", help="Reuse values and forward loads within basic blocks")
+	ap.add_argument(
+		"--switch-threshold",
+		type=int,
+		metavar="N",
+		help="Lower if/else-if chains testing one variable against N or more constants to a switch",
+	)
+	ap.add_argument(
+		"--profile-generate",
+		nargs="?",
+		const=DEFAULT_PROFILE_PATH,
+		metavar="PATH",
+		help=f"Instrument the program to write block counts to PATH (default {DEFAULT_PROFILE_PATH}) at exit",
+	)
+	ap.add_argument(
+		"--profile-use",
+		type=Path,
+		metavar="PROFILE",
+		help="Use a JSON profile for branch weights, block layout and inlining hints",
+	)
+	ap.add_argument(
+		"--print-mode",
+		choices=("buffered", "printf"),
+		default="buffered",
+		help="Lower print(int) to a buffered writer (default) or to one printf call per value",
+	)
+	ap.add_argument(
+		"--ipcp",
+		action="store_true",
+		help="Fold constant calls to pure functions and specialize functions for constant arguments",
+	)
+	ap.add_argument(
+		"--reachable-from",
+		action="append",
+		metavar="NAME",
+		help="Only parse and emit functions reachable from NAME (repeatable, e.g. main)",
+	)
+	args = ap.parse_args(argv)
 
 	inp: Path = args.input
 	outp: Path = args.output or inp.with_suffix(".ll")
-	compile_to_ll(inp, outp)
+	try:
+		result = compile_to_ll(
+			inp,
+			outp,
+			tre=args.tre,
+			tail_calls=args.tail_calls,
+			lvn=args.lvn,
+			switch_threshold=args.switch_threshold,
+			profile_generate=args.profile_generate,
+			profile_use=args.profile_use,
+			print_mode=args.print_mode,
+			ipcp=args.ipcp,
+			roots=args.reachable_from,
+		)
+	except ValueError as err:
+		# unknown --reachable-from names, malformed profiles
+		raise SystemExit(f"error: {err}")
 	print(f"Wrote {outp}")
+	if result.reachable is not None:
+		print(f"reachable: kept {result.reachable[0]} of {result.reachable[1]} functions")
+	if args.lvn:
+		print(f"lvn: eliminated {result.codegen.lvn_eliminated} instructions")
+	if result.ipcp is not None:
+		stats = result.ipcp
+		print(f"ipcp: folded {stats.folded} calls, specialized {stats.specialized} calls into {stats.clones} clones")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,100 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from string import Template
+from typing import Dict, List, Optional, Tuple
 
 from .ast_nodes import *  # noqa: F401,F403
+from .callgraph import call_graph, reachable
+from .profile import PROFILE_WRITER, Profile, branch_weights
 from .symbols import SymbolTable
+from .tailrec import has_tail_jump
+
+
+PRINT_BUFFER_SIZE = 65536
+
+# Runtime for the print(int) builtin: values are formatted into a module-level
+# buffer that is handed to write(2) only when it is nearly full and when main
+# returns. linkonce_odr lets the linker keep a single copy (and a single
+# buffer) when several units print.
+PRINT_RUNTIME = Template("""\
+@.print.buf = linkonce_odr global [$size x i8] zeroinitializer
+@.print.len = linkonce_odr global i32 0
+declare i64 @write(i32, i8*, i64)
+declare void @llvm.memcpy.p0i8.p0i8.i64(i8*, i8*, i64, i1)
+define linkonce_odr void @.print.flush() {
+entry:
+  %len = load i32, i32* @.print.len
+  store i32 0, i32* @.print.len
+  %total = zext i32 %len to i64
+  br label %loop
+loop:
+  %off = phi i64 [ 0, %entry ], [ %next, %wrote ]
+  %left = sub i64 %total, %off
+  %more = icmp sgt i64 %left, 0
+  br i1 %more, label %write, label %done
+write:
+  %p = getelementptr inbounds [$size x i8], [$size x i8]* @.print.buf, i64 0, i64 %off
+  %w = call i64 @write(i32 1, i8* %p, i64 %left)
+  %ok = icmp sgt i64 %w, 0
+  br i1 %ok, label %wrote, label %done
+wrote:
+  %next = add i64 %off, %w
+  br label %loop
+done:
+  ret void
+}
+define linkonce_odr void @.print.int(i32 %v) {
+entry:
+  %digits = alloca [11 x i8]
+  %len0 = load i32, i32* @.print.len
+  %full = icmp sgt i32 %len0, $limit
+  br i1 %full, label %flush, label %format
+flush:
+  call void @.print.flush()
+  br label %format
+format:
+  %len = load i32, i32* @.print.len
+  %neg = icmp slt i32 %v, 0
+  %wide = sext i32 %v to i64
+  %negated = sub i64 0, %wide
+  %mag = select i1 %neg, i64 %negated, i64 %wide
+  br label %digit
+digit:
+  %n = phi i64 [ %mag, %format ], [ %q, %digit ]
+  %i = phi i32 [ 11, %format ], [ %i.next, %digit ]
+  %q = udiv i64 %n, 10
+  %r = urem i64 %n, 10
+  %r8 = trunc i64 %r to i8
+  %ch = add i8 %r8, 48
+  %i.next = sub i32 %i, 1
+  %slot = getelementptr inbounds [11 x i8], [11 x i8]* %digits, i32 0, i32 %i.next
+  store i8 %ch, i8* %slot
+  %again = icmp ne i64 %q, 0
+  br i1 %again, label %digit, label %sign
+sign:
+  %i.sign = sub i32 %i.next, 1
+  %sign.slot = getelementptr inbounds [11 x i8], [11 x i8]* %digits, i32 0, i32 %i.sign
+  store i8 45, i8* %sign.slot
+  %start = select i1 %neg, i32 %i.sign, i32 %i.next
+  %count = sub i32 11, %start
+  %src = getelementptr inbounds [11 x i8], [11 x i8]* %digits, i32 0, i32 %start
+  %dst = getelementptr inbounds [$size x i8], [$size x i8]* @.print.buf, i32 0, i32 %len
+  %count64 = zext i32 %count to i64
+  call void @llvm.memcpy.p0i8.p0i8.i64(i8* %dst, i8* %src, i64 %count64, i1 false)
+  %end = add i32 %len, %count
+  %nl = getelementptr inbounds [$size x i8], [$size x i8]* @.print.buf, i32 0, i32 %end
+  store i8 10, i8* %nl
+  %len.next = add i32 %end, 1
+  store i32 %len.next, i32* @.print.len
+  ret void
+}""")
+
+
+def _c_string(text: str) -> Tuple[int, str]:
+	# NUL-terminated LLVM c"..." literal and its length in bytes
+	data = text.encode("utf-8") + b"\0"
+	lit = "".join(chr(b) if 32 <= b < 127 and b not in (34, 92) else f"\\{b:02X}" for b in data)
+	return len(data), lit
 
 
 class IRBuilder:
@@ -28,15 +119,71 @@ class IRBuilder:
 
 
 class Codegen:
-	def __init__(self) -> None:
+	def __init__(
+		self,
+		tail_calls: bool = False,
+		lvn: bool = False,
+		profile_generate: Optional[str] = None,
+		profile: Optional[Profile] = None,
+		print_mode: str = "buffered",
+	) -> None:
 		self.builder = IRBuilder()
 		self.globals = SymbolTable()
+		# mark calls `tail`; safe because callees can never see our allocas
+		self.tail_calls = tail_calls
+		self.alloca_at = 0
+		self.param_addrs: List[str] = []
+		self.tailrec_label: Optional[str] = None
+		# local value numbering: reuse pure results and forward loads/stores
+		# within one basic block; the tables are dropped at every label
+		self.lvn = lvn
+		self.lvn_eliminated = 0
+		self.vn_exprs: Dict[Tuple[str, ...], Tuple[str, int]] = {}
+		self.vn_mem: Dict[str, str] = {}
+		# profile_generate: path the instrumented program writes its counters
+		# to; profile: counters from such a run, used for weights and layout
+		self.profile_generate = profile_generate
+		self.profile = profile
+		self.prof_counters: List[str] = []
+		self.metadata: List[str] = []
+		self.fn_name = ""
+		self.site_counter = 0
+		# "buffered" uses PRINT_RUNTIME, "printf" one printf call per value
+		if print_mode not in ("buffered", "printf"):
+			raise ValueError(f"Unsupported print mode {print_mode}")
+		self.print_mode = print_mode
+		self.print_runtime = False
 
 	def generate(self, functions: List[FunctionDecl]) -> str:
 		self.builder.emit("declare i32 @printf(i8*, ...)")
-		self.builder.emit('@.fmt = private constant [4 x i8] c"%d\0A\00"')
+		self.builder.emit('@.fmt = private constant [4 x i8] c"%d\\0A\\00"')
+		for fn in functions:
+			self.globals.define_func(fn.name, fn.return_type, tuple(fn.params))
+		defined = {fn.name for fn in functions if fn.body is not None}
+		declared = set()
+		# a main that reaches functions from other units (declared or not) may
+		# be linked with ones that print, so it has to flush too
+		graph = call_graph(functions)
+		uses_print = any("print" in callees for callees in graph.values())
+		calls_out = "main" in defined and any(
+			callee not in defined and callee != "print"
+			for fn in reachable(functions, ("main",))
+			if fn.body is not None
+			for callee in graph[fn.name]
+		)
+		self.print_runtime = self.print_mode == "buffered" and "print" not in defined and (uses_print or calls_out)
 		for fn in functions:
-			self._emit_function(fn)
+			if fn.body is not None:
+				self._emit_function(fn)
+			elif fn.name not in defined and fn.name not in declared:
+				declared.add(fn.name)
+				self._emit_declare(fn)
+		if self.print_runtime:
+			self.builder.lines.extend(PRINT_RUNTIME.substitute(size=PRINT_BUFFER_SIZE, limit=PRINT_BUFFER_SIZE - 12).split("\n"))
+		if self.profile_generate is not None:
+			self._emit_profile_runtime(self.profile_generate, "main" in defined)
+		for i, md in enumerate(self.metadata):
+			self.builder.emit(f"!{i} = {md}")
 		return self.builder.build()
 
 	def _llvm_type(self, t: Type) -> str:
@@ -49,28 +196,188 @@ class Codegen:
 	def _emit_function(self, fn: FunctionDecl) -> None:
 		ret_ty = self._llvm_type(fn.return_type)
 		params_sig = ", ".join(f"{self._llvm_type(p.type)} %{p.name}" for p in fn.params)
-		self.builder.emit(f"define {ret_ty} @{fn.name}({params_sig}) {{")
-		self.builder.emit("entry:")
+		self.fn_name = fn.name
+		self.site_counter = 0
+		linkage = "internal " if fn.internal else ""
+		self.builder.emit(f"define {linkage}{ret_ty} @{fn.name}({params_sig}){self._function_profile(fn.name)} {{")
+		self._emit_label("entry")
+		self.alloca_at = len(self.builder.lines)
 		local = SymbolTable(self.globals)
+		self.param_addrs = []
 		for p in fn.params:
-			allptr = self.builder.new_temp()
-			self.builder.emit(f"  {allptr} = alloca {self._llvm_type(p.type)}")
+			allptr = self._emit_alloca(p.type)
 			self.builder.emit(f"  store {self._llvm_type(p.type)} %{p.name}, {self._llvm_type(p.type)}* {allptr}")
 			local.define_var(p.name, p.type)
 			setattr(local, f"addr_{p.name}", allptr)
+			self.param_addrs.append(allptr)
+			self.vn_mem[allptr] = f"%{p.name}"
+		self._count("entry")
+		self.tailrec_label = None
+		if has_tail_jump(fn.body):
+			self.tailrec_label = self.builder.new_label("tailrecurse")
+			self.builder.emit(f"  br label %{self.tailrec_label}")
+			self._emit_label(self.tailrec_label)
 		self._emit_block(fn.body, local)
 		if fn.return_type.name == "void":
-			self.builder.emit("  ret void")
+			self._emit_ret("void")
+		elif not self._terminated():
+			# falling off the end of an int function; keep the IR well-formed
+			self._emit_ret("i32 0")
 		self.builder.emit("}")
 
+	def _emit_declare(self, fn: FunctionDecl) -> None:
+		ret_ty = self._llvm_type(fn.return_type)
+		params_sig = ", ".join(self._llvm_type(p.type) for p in fn.params)
+		self.builder.emit(f"declare {ret_ty} @{fn.name}({params_sig})")
+
+	def _emit_alloca(self, t: Type) -> str:
+		# allocas live in the entry block so loops (including rewritten tail
+		# recursion) do not grow the stack on every iteration
+		addr = self.builder.new_temp()
+		self.builder.lines.insert(self.alloca_at, f"  {addr} = alloca {self._llvm_type(t)}")
+		self.alloca_at += 1
+		return addr
+
+	def _emit_label(self, label: str) -> None:
+		self.builder.emit(f"{label}:")
+		self.vn_exprs.clear()
+		self.vn_mem.clear()
+
+	def _vn_key(self, op: str, *operands: str) -> Tuple[str, ...]:
+		if op in ("+", "*", "==", "!=", "&&", "||"):
+			return (op, *sorted(operands))
+		return (op, *operands)
+
+	def _numbered(self, key: Tuple[str, ...]) -> Optional[str]:
+		if not self.lvn or key not in self.vn_exprs:
+			return None
+		res, cost = self.vn_exprs[key]
+		self.lvn_eliminated += cost
+		return res
+
+	def _new_site(self, kind: str) -> str:
+		# numbered the same way whether or not we are profiling, so that
+		# --profile-use finds the counters of a --profile-generate build
+		site = f"{kind}{self.site_counter}"
+		self.site_counter += 1
+		return site
+
+	def _count(self, site: str) -> None:
+		if self.profile_generate is None:
+			return
+		key = f"{self.fn_name}:{site}"
+		self.prof_counters.append(key)
+		counter = "@.prof." + key.replace(":", ".")
+		old = self.builder.new_temp()
+		self.builder.emit(f"  {old} = load i64, i64* {counter}")
+		new = self.builder.new_temp()
+		self.builder.emit(f"  {new} = add i64 {old}, 1")
+		self.builder.emit(f"  store i64 {new}, i64* {counter}")
+
+	def _site_count(self, site: str) -> Optional[int]:
+		if self.profile is None:
+			return None
+		return self.profile.count(self.fn_name, site)
+
+	def _branch_weights(self, *sites: str) -> str:
+		counts = [self._site_count(s) for s in sites]
+		if all(c is None for c in counts):
+			return ""
+		weights = branch_weights([c or 0 for c in counts])
+		body = ", ".join(f"i32 {w}" for w in weights)
+		md = self._add_metadata('!{!"branch_weights", ' + body + "}")
+		return f", !prof {md}"
+
+	def _function_profile(self, name: str) -> str:
+		if self.profile is None:
+			return ""
+		entry = self.profile.count(name, "entry")
+		if entry is None:
+			return ""
+		attrs = ""
+		if self.profile.is_cold(name):
+			attrs = " cold"
+		elif self.profile.is_hot(name) and name != "main":
+			attrs = " inlinehint"
+		md = self._add_metadata(f'!{{!"function_entry_count", i64 {entry}}}')
+		return f"{attrs} !prof {md}"
+
+	def _add_metadata(self, text: str) -> str:
+		self.metadata.append(text)
+		return f"!{len(self.metadata) - 1}"
+
+	def _emit_profile_runtime(self, path: str, with_dump: bool) -> None:
+		# counters and PROFILE_WRITER, which appends them to an open profile
+		# file. main's unit also gets @.prof.dump (called when main returns),
+		# which writes the JSON envelope around the writer's entries; the
+		# linker makes it call the writer of every linked unit. See profile.py
+		# for the format.
+		if not self.prof_counters:
+			return
+		for key in self.prof_counters:
+			self.builder.emit(f"@.prof.{key.replace(':', '.')} = private global i64 0")
+		entries = ",\n".join(f'    "{key}": %lld' for key in self.prof_counters)
+		strings = {"fmt": "%s\n" + entries, "comma": ","}
+		if with_dump:
+			strings.update(path=path, mode="w", empty="", head='{\n  "version": 1,\n  "counters": {', tail="\n  }\n}\n")
+		ptrs = {}
+		for name, value in strings.items():
+			size, lit = _c_string(value)
+			self.builder.emit(f"@.prof.{name} = private constant [{size} x i8] c\"{lit}\"")
+			ptrs[name] = f"i8* getelementptr inbounds ([{size} x i8], [{size} x i8]* @.prof.{name}, i64 0, i64 0)"
+		self.builder.emit("declare i32 @fprintf(i8*, i8*, ...)")
+		# entries are separated by the string *sep points to: empty before the
+		# first unit, a comma after it
+		self.builder.emit(f"define private void @{PROFILE_WRITER}(i8* %f, i8** %sep) {{")
+		self.builder.emit("entry:")
+		self.builder.emit("  %s = load i8*, i8** %sep")
+		args = ["i8* %f", ptrs["fmt"], "i8* %s"]
+		for i, key in enumerate(self.prof_counters):
+			self.builder.emit(f"  %c{i} = load i64, i64* @.prof.{key.replace(':', '.')}")
+			args.append(f"i64 %c{i}")
+		self.builder.emit(f"  %w = call i32 (i8*, i8*, ...) @fprintf({', '.join(args)})")
+		self.builder.emit(f"  store {ptrs['comma']}, i8** %sep")
+		self.builder.emit("  ret void")
+		self.builder.emit("}")
+		if not with_dump:
+			return
+		self.builder.emit("declare i8* @fopen(i8*, i8*)")
+		self.builder.emit("declare i32 @fclose(i8*)")
+		self.builder.emit("define private void @.prof.dump() {")
+		self.builder.emit("entry:")
+		self.builder.emit("  %sep = alloca i8*")
+		self.builder.emit(f"  store {ptrs['empty']}, i8** %sep")
+		self.builder.emit(f"  %f = call i8* @fopen({ptrs['path']}, {ptrs['mode']})")
+		self.builder.emit("  %failed = icmp eq i8* %f, null")
+		self.builder.emit("  br i1 %failed, label %done, label %write")
+		self.builder.emit("write:")
+		self.builder.emit(f"  %h = call i32 (i8*, i8*, ...) @fprintf(i8* %f, {ptrs['head']})")
+		self.builder.emit(f"  call void @{PROFILE_WRITER}(i8* %f, i8** %sep)")
+		self.builder.emit(f"  %t = call i32 (i8*, i8*, ...) @fprintf(i8* %f, {ptrs['tail']})")
+		self.builder.emit("  %cl = call i32 @fclose(i8* %f)")
+		self.builder.emit("  br label %done")
+		self.builder.emit("done:")
+		self.builder.emit("  ret void")
+		self.builder.emit("}")
+
+	def _emit_ret(self, value: str) -> None:
+		if self.fn_name == "main" and self.print_runtime:
+			self.builder.emit("  call void @.print.flush()")
+		if self.fn_name == "main" and self.profile_generate is not None:
+			self.builder.emit("  call void @.prof.dump()")
+		self.builder.emit(f"  ret {value}")
+
+	def _terminated(self) -> bool:
+		last = self.builder.lines[-1]
+		return last.startswith("  ret ") or last.startswith("  br ") or last == "  unreachable"
+
 	def _emit_block(self, block: Block, syms: SymbolTable) -> None:
 		for st in block.statements:
 			self._emit_stmt(st, syms)
 
 	def _emit_stmt(self, st: Stmt, syms: SymbolTable) -> None:
 		if isinstance(st, VarDecl):
-			addr = self.builder.new_temp()
-			self.builder.emit(f"  {addr} = alloca {self._llvm_type(st.type)}")
+			addr = self._emit_alloca(st.type)
 			syms.define_var(st.name, st.type)
 			setattr(syms, f"addr_{st.name}", addr)
 			return
@@ -80,48 +387,85 @@ class Codegen:
 			return
 		if isinstance(st, ReturnStmt):
 			if st.value is None:
-				self.builder.emit("  ret void")
+				self._emit_ret("void")
 				return
 			val, vty = self._emit_expr(st.value, syms)
-			self.builder.emit(f"  ret {vty} {val}")
+			self._emit_ret(f"{vty} {val}")
 			return
 		if isinstance(st, IfStmt):
+			site = self._new_site("if")
 			cond_val, _ = self._emit_expr(st.cond, syms)
 			cmp = self.builder.new_temp()
 			self.builder.emit(f"  {cmp} = icmp ne i32 {cond_val}, 0")
 			then_lbl = self.builder.new_label("then")
-			else_lbl = self.builder.new_label("else") if st.else_block else None
+			# when profiling, the false edge needs a block of its own to count it
+			has_else = st.else_block is not None or self.profile_generate is not None
+			else_lbl = self.builder.new_label("else") if has_else else None
 			end_lbl = self.builder.new_label("endif")
+			weights = self._branch_weights(f"{site}.then", f"{site}.else")
+			self.builder.emit(f"  br i1 {cmp}, label %{then_lbl}, label %{else_lbl or end_lbl}{weights}")
+			arms = [("then", then_lbl, st.then_block)]
 			if else_lbl:
-				self.builder.emit(f"  br i1 {cmp}, label %{then_lbl}, label %{else_lbl}")
-				self.builder.emit(f"{then_lbl}:")
-				self._emit_block(st.then_block, syms)
-				self.builder.emit(f"  br label %{end_lbl}")
-				self.builder.emit(f"{else_lbl}:")
-				self._emit_block(st.else_block, syms)  # type: ignore[arg-type]
+				arms.append(("else", else_lbl, st.else_block))
+				# lay the hotter arm out first
+				if (self._site_count(f"{site}.else") or 0) > (self._site_count(f"{site}.then") or 0):
+					arms.reverse()
+			for arm, lbl, body in arms:
+				self._emit_label(lbl)
+				self._count(f"{site}.{arm}")
+				if body is not None:
+					self._emit_block(body, syms)
 				self.builder.emit(f"  br label %{end_lbl}")
-				self.builder.emit(f"{end_lbl}:")
-				return
-			self.builder.emit(f"  br i1 {cmp}, label %{then_lbl}, label %{end_lbl}")
-			self.builder.emit(f"{then_lbl}:")
-			self._emit_block(st.then_block, syms)
-			self.builder.emit(f"  br label %{end_lbl}")
-			self.builder.emit(f"{end_lbl}:")
+			self._emit_label(end_lbl)
 			return
 		if isinstance(st, WhileStmt):
+			site = self._new_site("while")
 			cond_lbl = self.builder.new_label("while.cond")
 			body_lbl = self.builder.new_label("while.body")
 			end_lbl = self.builder.new_label("while.end")
 			self.builder.emit(f"  br label %{cond_lbl}")
-			self.builder.emit(f"{cond_lbl}:")
+			self._emit_label(cond_lbl)
 			cond_val, _ = self._emit_expr(st.cond, syms)
 			cmp = self.builder.new_temp()
 			self.builder.emit(f"  {cmp} = icmp ne i32 {cond_val}, 0")
-			self.builder.emit(f"  br i1 {cmp}, label %{body_lbl}, label %{end_lbl}")
-			self.builder.emit(f"{body_lbl}:")
+			weights = self._branch_weights(f"{site}.body", f"{site}.exit")
+			self.builder.emit(f"  br i1 {cmp}, label %{body_lbl}, label %{end_lbl}{weights}")
+			self._emit_label(body_lbl)
+			self._count(f"{site}.body")
 			self._emit_block(st.body, syms)
 			self.builder.emit(f"  br label %{cond_lbl}")
-			self.builder.emit(f"{end_lbl}:")
+			self._emit_label(end_lbl)
+			self._count(f"{site}.exit")
+			return
+		if isinstance(st, SwitchStmt):
+			site = self._new_site("switch")
+			val, _ = self._emit_expr(st.subject, syms)
+			case_lbls = [self.builder.new_label("case") for _ in st.cases]
+			has_default = st.default is not None or self.profile_generate is not None
+			default_lbl = self.builder.new_label("default") if has_default else None
+			end_lbl = self.builder.new_label("endswitch")
+			targets = " ".join(f"i32 {k}, label %{lbl}" for (k, _), lbl in zip(st.cases, case_lbls))
+			weights = self._branch_weights(f"{site}.default", *(f"{site}.case{k}" for k, _ in st.cases))
+			self.builder.emit(f"  switch i32 {val}, label %{default_lbl or end_lbl} [ {targets} ]{weights}")
+			for (k, body), lbl in zip(st.cases, case_lbls):
+				self._emit_label(lbl)
+				self._count(f"{site}.case{k}")
+				self._emit_block(body, syms)
+				self.builder.emit(f"  br label %{end_lbl}")
+			if default_lbl:
+				self._emit_label(default_lbl)
+				self._count(f"{site}.default")
+				if st.default is not None:
+					self._emit_block(st.default, syms)
+				self.builder.emit(f"  br label %{end_lbl}")
+			self._emit_label(end_lbl)
+			return
+		if isinstance(st, TailJump):
+			# evaluate every argument before storing any, as a call would
+			vals = [self._emit_expr(a, syms)[0] for a in st.args]
+			for addr, val in zip(self.param_addrs, vals):
+				self.builder.emit(f"  store i32 {val}, i32* {addr}")
+			self.builder.emit(f"  br label %{self.tailrec_label}")
 			return
 		raise NotImplementedError(str(st))
 
@@ -130,87 +474,126 @@ class Codegen:
 			return str(e.value), "i32"
 		if isinstance(e, Var):
 			addr = getattr(syms, f"addr_{e.name}")
+			if self.lvn and addr in self.vn_mem:
+				self.lvn_eliminated += 1
+				return self.vn_mem[addr], "i32"
 			res = self.builder.new_temp()
 			self.builder.emit(f"  {res} = load i32, i32* {addr}")
+			self.vn_mem[addr] = res
 			return res, "i32"
 		if isinstance(e, Assign):
 			val, _ = self._emit_expr(e.value, syms)
 			addr = getattr(syms, f"addr_{e.name}")
 			self.builder.emit(f"  store i32 {val}, i32* {addr}")
+			self.vn_mem[addr] = val
 			return val, "i32"
-		if isinstance(e, Unary):
-			v, _ = self._emit_expr(e.value, syms)
-			if e.op == "-":
-				res = self.builder.new_temp()
-				self.builder.emit(f"  {res} = sub i32 0, {v}")
-				return res, "i32"
-			if e.op == "!":
-				cmp = self.builder.new_temp()
-				self.builder.emit(f"  {cmp} = icmp eq i32 {v}, 0")
-				zext = self.builder.new_temp()
-				self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
-				return zext, "i32"
-			raise NotImplementedError(e.op)
-		if isinstance(e, Binary):
-			l, _ = self._emit_expr(e.left, syms)
-			r, _ = self._emit_expr(e.right, syms)
-			res = self.builder.new_temp()
-			if e.op == "+":
-				self.builder.emit(f"  {res} = add i32 {l}, {r}")
-				return res, "i32"
-			if e.op == "-":
-				self.builder.emit(f"  {res} = sub i32 {l}, {r}")
-				return res, "i32"
-			if e.op == "*":
-				self.builder.emit(f"  {res} = mul i32 {l}, {r}")
-				return res, "i32"
-			if e.op == "/":
-				self.builder.emit(f"  {res} = sdiv i32 {l}, {r}")
-				return res, "i32"
-			if e.op == "%":
-				self.builder.emit(f"  {res} = srem i32 {l}, {r}")
-				return res, "i32"
-			if e.op in ("<", "<=", ">", ">=", "==", "!="):
-				cmp = self.builder.new_temp()
-				pred = {
-					"<": "slt",
-					"<=": "sle",
-					">": "sgt",
-					">=": "sge",
-					"==": "eq",
-					"!=": "ne",
-				}[e.op]
-				self.builder.emit(f"  {cmp} = icmp {pred} i32 {l}, {r}")
-				zext = self.builder.new_temp()
-				self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
-				return zext, "i32"
-			if e.op == "&&":
-				# simple: compute both, and
-				andv = self.builder.new_temp()
-				self.builder.emit(f"  {andv} = and i32 {l}, {r}")
-				cmp = self.builder.new_temp()
-				self.builder.emit(f"  {cmp} = icmp ne i32 {andv}, 0")
-				zext = self.builder.new_temp()
-				self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
-				return zext, "i32"
-			if e.op == "||":
-				orv = self.builder.new_temp()
-				self.builder.emit(f"  {orv} = or i32 {l}, {r}")
-				cmp = self.builder.new_temp()
-				self.builder.emit(f"  {cmp} = icmp ne i32 {orv}, 0")
-				zext = self.builder.new_temp()
-				self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
-				return zext, "i32"
-			raise NotImplementedError(e.op)
+		if isinstance(e, (Unary, Binary)):
+			if isinstance(e, Unary):
+				v, _ = self._emit_expr(e.value, syms)
+				key = self._vn_key("u" + e.op, v)
+			else:
+				l, _ = self._emit_expr(e.left, syms)
+				r, _ = self._emit_expr(e.right, syms)
+				key = self._vn_key(e.op, l, r)
+			known = self._numbered(key)
+			if known is not None:
+				return known, "i32"
+			start = len(self.builder.lines)
+			if isinstance(e, Unary):
+				res, ty = self._emit_unary(e.op, v)
+			else:
+				res, ty = self._emit_binary(e.op, l, r)
+			self.vn_exprs[key] = (res, len(self.builder.lines) - start)
+			return res, ty
 		if isinstance(e, Call):
 			args_vals = []
 			for a in e.args:
 				v, vty = self._emit_expr(a, syms)
 				args_vals.append(f"{vty} {v}")
+			# conservative: once globals or pointers exist a callee may write
+			# any slot, so forget what memory holds
+			self.vn_mem.clear()
+			call = "tail call" if self.tail_calls else "call"
+			fsym = self.globals.resolve_func(e.name)
+			if fsym is None and e.name == "print":
+				if len(args_vals) != 1:
+					raise ValueError("print expects one argument")
+				if self.print_mode == "printf":
+					fmt = "i8* getelementptr inbounds ([4 x i8], [4 x i8]* @.fmt, i64 0, i64 0)"
+					res = self.builder.new_temp()
+					self.builder.emit(f"  {res} = {call} i32 (i8*, ...) @printf({fmt}, {args_vals[0]})")
+				else:
+					self.builder.emit(f"  {call} void @.print.int({args_vals[0]})")
+				return "0", "i32"
+			if fsym is not None and fsym.return_type.name == "void":
+				self.builder.emit(f"  {call} void @{e.name}({', '.join(args_vals)})")
+				return "0", "i32"
 			res = self.builder.new_temp()
-			self.builder.emit(f"  {res} = call i32 @{e.name}({', '.join(args_vals)})")
+			self.builder.emit(f"  {res} = {call} i32 @{e.name}({', '.join(args_vals)})")
 			return res, "i32"
 		raise NotImplementedError(str(e))
 
+	def _emit_unary(self, op: str, v: str) -> Tuple[str, str]:
+		if op == "-":
+			res = self.builder.new_temp()
+			self.builder.emit(f"  {res} = sub i32 0, {v}")
+			return res, "i32"
+		if op == "!":
+			cmp = self.builder.new_temp()
+			self.builder.emit(f"  {cmp} = icmp eq i32 {v}, 0")
+			zext = self.builder.new_temp()
+			self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
+			return zext, "i32"
+		raise NotImplementedError(op)
 
-
+	def _emit_binary(self, op: str, l: str, r: str) -> Tuple[str, str]:
+		res = self.builder.new_temp()
+		if op == "+":
+			self.builder.emit(f"  {res} = add i32 {l}, {r}")
+			return res, "i32"
+		if op == "-":
+			self.builder.emit(f"  {res} = sub i32 {l}, {r}")
+			return res, "i32"
+		if op == "*":
+			self.builder.emit(f"  {res} = mul i32 {l}, {r}")
+			return res, "i32"
+		if op == "/":
+			self.builder.emit(f"  {res} = sdiv i32 {l}, {r}")
+			return res, "i32"
+		if op == "%":
+			self.builder.emit(f"  {res} = srem i32 {l}, {r}")
+			return res, "i32"
+		if op in ("<", "<=", ">", ">=", "==", "!="):
+			cmp = self.builder.new_temp()
+			pred = {
+				"<": "slt",
+				"<=": "sle",
+				">": "sgt",
+				">=": "sge",
+				"==": "eq",
+				"!=": "ne",
+			}[op]
+			self.builder.emit(f"  {cmp} = icmp {pred} i32 {l}, {r}")
+			zext = self.builder.new_temp()
+			self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
+			return zext, "i32"
+		if op == "&&":
+			# simple: compute both, and their truth values
+			lt = self.builder.new_temp()
+			self.builder.emit(f"  {lt} = icmp ne i32 {l}, 0")
+			rt = self.builder.new_temp()
+			self.builder.emit(f"  {rt} = icmp ne i32 {r}, 0")
+			cmp = self.builder.new_temp()
+			self.builder.emit(f"  {cmp} = and i1 {lt}, {rt}")
+			zext = self.builder.new_temp()
+			self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
+			return zext, "i32"
+		if op == "||":
+			orv = self.builder.new_temp()
+			self.builder.emit(f"  {orv} = or i32 {l}, {r}")
+			cmp = self.builder.new_temp()
+			self.builder.emit(f"  {cmp} = icmp ne i32 {orv}, 0")
+			zext = self.builder.new_temp()
+			self.builder.emit(f"  {zext} = zext i1 {cmp} to i32")
+			return zext, "i32"
+		raise NotImplementedError(op)
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .ast_nodes import *  # noqa: F401,F403
+from .callgraph import call_graph, iter_calls
+from .profile import Profile
+
+
+# evaluation steps allowed for folding one call at compile time
+DEFAULT_STEP_BUDGET = 10000
+
+# (parameter index, constant) pairs a clone was specialized for
+Key = Tuple[Tuple[int, int], ...]
+
+
+@dataclass
+class IPCPStats:
+	folded: int = 0
+	specialized: int = 0
+	clones: int = 0
+
+
+# Interprocedural constant propagation over the whole translation unit:
+#  - calls to pure, non-recursive functions with constant arguments are
+#    evaluated at compile time (within `budget` steps) and replaced by the result
+#  - parameters that get the same constant at every call site (or every
+#    constant argument of a call made from a function the profile marks hot)
+#    are specialized: the callee is cloned with those parameters substituted,
+#    the clone is simplified and the calls are redirected to it.
+# Clones are appended to `functions`; the originals stay for other units.
+def propagate_constants(
+	functions: List[FunctionDecl],
+	profile: Optional[Profile] = None,
+	budget: int = DEFAULT_STEP_BUDGET,
+) -> IPCPStats:
+	stats = IPCPStats()
+	defined = {fn.name: fn for fn in functions if fn.body is not None}
+	evaluator = _Evaluator(defined, _foldable(functions), budget)
+
+	def fold(call: Call) -> Optional[int]:
+		value = evaluator.fold(call)
+		if value is not None:
+			stats.folded += 1
+		return value
+
+	for fn in list(defined.values()):
+		_simplify_block(fn.body, {}, fold)  # type: ignore[arg-type]
+
+	everywhere = _constant_everywhere(defined)
+	clones: Dict[Tuple[str, Key], FunctionDecl] = {}
+	work = list(defined.values())
+	while work:
+		caller = work.pop(0)
+		hot = profile is not None and profile.is_hot(caller.name)
+		for call in iter_calls(caller.body):  # type: ignore[arg-type]
+			callee = defined.get(call.name)
+			if callee is None or len(call.args) != len(callee.params):
+				continue
+			consts = _constant_args(call)
+			key = tuple(sorted(consts.items())) if hot else everywhere.get(callee.name, ())
+			if not key or any(consts.get(i) != k for i, k in key):
+				continue
+			clone = clones.get((callee.name, key))
+			if clone is None:
+				clone = _clone(callee, key, f"{callee.name}.spec{len(clones)}", fold)
+				clones[(callee.name, key)] = clone
+				functions.append(clone)
+				work.append(clone)
+				stats.clones += 1
+			positions = dict(key)
+			call.name = clone.name
+			call.args = [a for i, a in enumerate(call.args) if i not in positions]
+			stats.specialized += 1
+	return stats
+
+
+def _constant(e: Expr) -> Optional[int]:
+	return e.value if isinstance(e, Number) else None
+
+
+def _constant_args(call: Call) -> Dict[int, int]:
+	return {i: a.value for i, a in enumerate(call.args) if isinstance(a, Number)}
+
+
+def _constant_everywhere(defined: Dict[str, FunctionDecl]) -> Dict[str, Key]:
+	# values passed per callee and parameter position; None marks a
+	# non-constant argument
+	seen: Dict[str, Dict[int, Set[Optional[int]]]] = {}
+	for fn in defined.values():
+		for call in iter_calls(fn.body):  # type: ignore[arg-type]
+			callee = defined.get(call.name)
+			if callee is None or len(call.args) != len(callee.params):
+				continue
+			written = _written_names(fn.body) if callee is fn else set()  # type: ignore[arg-type]
+			values = seen.setdefault(call.name, {})
+			for i, (a, p) in enumerate(zip(call.args, callee.params)):
+				# a recursive call handing a parameter through unchanged agrees
+				# with whatever constant the outside callers pass
+				if callee is fn and isinstance(a, Var) and a.name == p.name and p.name not in written:
+					continue
+				values.setdefault(i, set()).add(_constant(a))
+	keys: Dict[str, Key] = {}
+	for name, values in seen.items():
+		keys[name] = tuple(
+			(i, next(iter(vs))) for i, vs in sorted(values.items()) if len(vs) == 1 and None not in vs
+		)
+	return keys
+
+
+def _foldable(functions: List[FunctionDecl]) -> Set[str]:
+	# int functions that only call defined, pure functions and cannot reach
+	# themselves
+	graph = call_graph(functions)
+	pure = set(graph)
+	changed = True
+	while changed:
+		changed = False
+		for name in list(pure):
+			if not graph[name] <= pure:
+				pure.discard(name)
+				changed = True
+	returns_int = {fn.name for fn in functions if fn.body is not None and fn.return_type.name == "int"}
+	return {name for name in pure & returns_int if name not in _reachable(graph, name)}
+
+
+def _reachable(graph: Dict[str, Set[str]], root: str) -> Set[str]:
+	seen: Set[str] = set()
+	stack = list(graph.get(root, ()))
+	while stack:
+		name = stack.pop()
+		if name not in seen:
+			seen.add(name)
+			stack.extend(graph.get(name, ()))
+	return seen
+
+
+def _clone(callee: FunctionDecl, key: Key, name: str, fold: Callable[[Call], Optional[int]]) -> FunctionDecl:
+	body = copy.deepcopy(callee.body)
+	positions = dict(key)
+	written = _written_names(body)  # type: ignore[arg-type]
+	consts: Dict[str, int] = {}
+	prologue: List[Stmt] = []
+	for i, k in key:
+		p = callee.params[i]
+		if p.name in written:
+			# the body reassigns it: keep a local initialised to the constant
+			prologue += [VarDecl(p.type, p.name), ExprStmt(Assign(p.name, Number(k)))]
+		else:
+			consts[p.name] = k
+	body.statements[:0] = prologue  # type: ignore[union-attr]
+	_simplify_block(body, consts, fold)  # type: ignore[arg-type]
+	params = [p for i, p in enumerate(callee.params) if i not in positions]
+	return FunctionDecl(callee.return_type, name, params, body, internal=True)
+
+
+def _written_names(block: Block) -> Set[str]:
+	names: Set[str] = set()
+
+	def expr(e: Optional[Expr]) -> None:
+		if isinstance(e, Assign):
+			names.add(e.name)
+			expr(e.value)
+		elif isinstance(e, Binary):
+			expr(e.left)
+			expr(e.right)
+		elif isinstance(e, Unary):
+			expr(e.value)
+		elif isinstance(e, Call):
+			for a in e.args:
+				expr(a)
+
+	def walk(b: Block) -> None:
+		for st in b.statements:
+			if isinstance(st, VarDecl):
+				names.add(st.name)
+			elif isinstance(st, ExprStmt):
+				expr(st.expr)
+			elif isinstance(st, ReturnStmt):
+				expr(st.value)
+			elif isinstance(st, IfStmt):
+				expr(st.cond)
+				walk(st.then_block)
+				if st.else_block:
+					walk(st.else_block)
+			elif isinstance(st, WhileStmt):
+				expr(st.cond)
+				walk(st.body)
+			elif isinstance(st, SwitchStmt):
+				for _, case in st.cases:
+					walk(case)
+				if st.default:
+					walk(st.default)
+			elif isinstance(st, TailJump):
+				for a in st.args:
+					expr(a)
+
+	walk(block)
+	return names
+
+
+def _simplify_block(block: Block, consts: Dict[str, int], fold: Callable[[Call], Optional[int]]) -> None:
+	out: List[Stmt] = []
+	for st in block.statements:
+		if isinstance(st, ExprStmt) and st.expr is not None:
+			st.expr = _simplify(st.expr, consts, fold)
+		elif isinstance(st, ReturnStmt) and st.value is not None:
+			st.value = _simplify(st.value, consts, fold)
+		elif isinstance(st, IfStmt):
+			st.cond = _simplify(st.cond, consts, fold)
+			k = _constant(st.cond)
+			if k is not None:
+				# blocks do not open a scope, so the taken arm can be spliced in
+				taken = st.then_block if k != 0 else st.else_block
+				if taken is not None:
+					_simplify_block(taken, consts, fold)
+					out.extend(taken.statements)
+				if out and isinstance(out[-1], (ReturnStmt, TailJump)):
+					break
+				continue
+			_simplify_block(st.then_block, consts, fold)
+			if st.else_block:
+				_simplify_block(st.else_block, consts, fold)
+		elif isinstance(st, WhileStmt):
+			st.cond = _simplify(st.cond, consts, fold)
+			if _constant(st.cond) == 0:
+				continue
+			_simplify_block(st.body, consts, fold)
+		elif isinstance(st, SwitchStmt):
+			for _, case in st.cases:
+				_simplify_block(case, consts, fold)
+			if st.default:
+				_simplify_block(st.default, consts, fold)
+		elif isinstance(st, TailJump):
+			st.args = [_simplify(a, consts, fold) for a in st.args]
+		out.append(st)
+		if isinstance(st, (ReturnStmt, TailJump)):
+			# the rest of the block is unreachable
+			break
+	block.statements = out
+
+
+def _simplify(e: Expr, consts: Dict[str, int], fold: Callable[[Call], Optional[int]]) -> Expr:
+	if isinstance(e, Var) and e.name in consts:
+		return Number(consts[e.name])
+	if isinstance(e, Assign):
+		e.value = _simplify(e.value, consts, fold)
+		return e
+	if isinstance(e, Unary):
+		e.value = _simplify(e.value, consts, fold)
+		v = _constant(e.value)
+		if v is not None:
+			res = apply_unary(e.op, v)
+			if res is not None:
+				return Number(res)
+		return e
+	if isinstance(e, Binary):
+		e.left = _simplify(e.left, consts, fold)
+		e.right = _simplify(e.right, consts, fold)
+		l, r = _constant(e.left), _constant(e.right)
+		if l is not None and r is not None:
+			res = apply_binary(e.op, l, r)
+			if res is not None:
+				return Number(res)
+		return e
+	if isinstance(e, Call):
+		e.args = [_simplify(a, consts, fold) for a in e.args]
+		value = fold(e)
+		if value is not None:
+			return Number(value)
+		return e
+	return e
+
+
+def _wrap(v: int) -> int:
+	v &= 0xFFFFFFFF
+	return v - (1 << 32) if v & 0x80000000 else v
+
+
+def apply_unary(op: str, v: int) -> Optional[int]:
+	if op == "-":
+		return _wrap(-v)
+	if op == "!":
+		return int(v == 0)
+	return None
+
+
+# i32 semantics of the IR Codegen emits; None where the result is undefined
+# (division by zero, INT_MIN / -1)
+def apply_binary(op: str, l: int, r: int) -> Optional[int]:
+	if op == "+":
+		return _wrap(l + r)
+	if op == "-":
+		return _wrap(l - r)
+	if op == "*":
+		return _wrap(l * r)
+	if op in ("/", "%"):
+		if r == 0 or (l == -(1 << 31) and r == -1):
+			return None
+		q = abs(l) // abs(r)
+		if (l < 0) != (r < 0):
+			q = -q
+		return q if op == "/" else l - q * r
+	if op == "<":
+		return int(l < r)
+	if op == "<=":
+		return int(l <= r)
+	if op == ">":
+		return int(l > r)
+	if op == ">=":
+		return int(l >= r)
+	if op == "==":
+		return int(l == r)
+	if op == "!=":
+		return int(l != r)
+	if op == "&&":
+		return int(l != 0 and r != 0)
+	if op == "||":
+		return int(l != 0 or r != 0)
+	return None
+
+
+class _NotConstant(Exception):
+	pass
+
+
+class _Return(Exception):
+	def __init__(self, value: int) -> None:
+		self.value = value
+
+
+class _Evaluator:
+	def __init__(self, functions: Dict[str, FunctionDecl], foldable: Set[str], budget: int) -> None:
+		self.functions = functions
+		self.foldable = foldable
+		self.budget = budget
+		self.steps = 0
+
+	def fold(self, call: Call) -> Optional[int]:
+		if call.name not in self.foldable:
+			return None
+		args = [_constant(a) for a in call.args]
+		if any(a is None for a in args) or len(args) != len(self.functions[call.name].params):
+			return None
+		self.steps = self.budget
+		try:
+			return self._call(self.functions[call.name], args)  # type: ignore[arg-type]
+		except _NotConstant:
+			return None
+
+	def _tick(self) -> None:
+		self.steps -= 1
+		if self.steps < 0:
+			raise _NotConstant()
+
+	def _call(self, fn: FunctionDecl, args: List[int]) -> int:
+		env = {p.name: a for p, a in zip(fn.params, args)}
+		try:
+			self._block(fn.body, env)  # type: ignore[arg-type]
+		except _Return as ret:
+			return ret.value
+		# fell off the end of an int function
+		raise _NotConstant()
+
+	def _block(self, block: Block, env: Dict[str, int]) -> None:
+		for st in block.statements:
+			self._stmt(st, env)
+
+	def _stmt(self, st: Stmt, env: Dict[str, int]) -> None:
+		self._tick()
+		if isinstance(st, VarDecl):
+			env.pop(st.name, None)
+		elif isinstance(st, ExprStmt):
+			if st.expr is not None:
+				self._expr(st.expr, env)
+		elif isinstance(st, ReturnStmt):
+			if st.value is None:
+				raise _NotConstant()
+			raise _Return(self._expr(st.value, env))
+		elif isinstance(st, IfStmt):
+			if self._expr(st.cond, env) != 0:
+				self._block(st.then_block, env)
+			elif st.else_block:
+				self._block(st.else_block, env)
+		elif isinstance(st, WhileStmt):
+			while self._expr(st.cond, env) != 0:
+				self._block(st.body, env)
+				self._tick()
+		elif isinstance(st, SwitchStmt):
+			v = self._expr(st.subject, env)
+			for k, case in st.cases:
+				if k == v:
+					self._block(case, env)
+					return
+			if st.default:
+				self._block(st.default, env)
+		else:
+			raise _NotConstant()
+
+	def _expr(self, e: Expr, env: Dict[str, int]) -> int:
+		self._tick()
+		if isinstance(e, Number):
+			return e.value
+		if isinstance(e, Var):
+			if e.name not in env:
+				raise _NotConstant()
+			return env[e.name]
+		if isinstance(e, Assign):
+			env[e.name] = self._expr(e.value, env)
+			return env[e.name]
+		res: Optional[int] = None
+		if isinstance(e, Unary):
+			res = apply_unary(e.op, self._expr(e.value, env))
+		elif isinstance(e, Binary):
+			res = apply_binary(e.op, self._expr(e.left, env), self._expr(e.right, env))
+		elif isinstance(e, Call) and e.name in self.foldable:
+			res = self._call(self.functions[e.name], [self._expr(a, env) for a in e.args])
+		if res is None:
+			raise _NotConstant()
+		return res
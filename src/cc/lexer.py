@@ -9,14 +9,17 @@ from .tokens import Token, KEYWORDS
 WHITESPACE = re.compile(r"[ \t]+")
 IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 NUMBER = re.compile(r"\d+")
+# what matters when skimming a function body: braces, and comments that may
+# contain them
+BODY_SCAN = re.compile(r"[{}]|//[^\n]*|/\*.*?\*/", re.S)
 
 
 class Lexer:
-	def __init__(self, source: str) -> None:
+	def __init__(self, source: str, line: int = 1, column: int = 1) -> None:
 		self.source = source
 		self.index = 0
-		self.line = 1
-		self.column = 1
+		self.line = line
+		self.column = column
 
 	def _peek(self, n: int = 0) -> str:
 		if self.index + n >= len(self.source):
@@ -71,7 +74,33 @@ class Lexer:
 				continue
 			break
 
-	def tokenize(self) -> List[Token]:
+	def _skip_to(self, end: int) -> None:
+		newlines = self.source.count("\n", self.index, end)
+		if newlines:
+			self.line += newlines
+			self.column = end - self.source.rfind("\n", self.index, end)
+		else:
+			self.column += end - self.index
+		self.index = end
+
+	def _skim_body(self, start_line: int, start_col: int) -> str:
+		# called just after a top-level '{'; moves past the matching '}'
+		# without tokenizing and returns the text in between, '}' included
+		start = self.index
+		depth = 1
+		for m in BODY_SCAN.finditer(self.source, start):
+			if m.group() == "{":
+				depth += 1
+			elif m.group() == "}":
+				depth -= 1
+				if depth == 0:
+					self._skip_to(m.end())
+					return self.source[start : m.end()]
+		raise SyntaxError(f"Unmatched '{{' at {start_line}:{start_col}")
+
+	def tokenize(self, skim_bodies: bool = False) -> List[Token]:
+		# skim_bodies: emit each function body (every top-level '{ ... }') as
+		# one BODY token holding its source, to be tokenized only if needed
 		tokens: List[Token] = []
 		while True:
 			self._skip_whitespace_and_comments()
@@ -81,16 +110,23 @@ class Lexer:
 				break
 
 			# Multi-char operators
+			matched = False
 			for op in ("==", "!=", "<=", ">=", "&&", "||"):
 				if self._match(op):
 					tokens.append(Token("SYMBOL", op, start_line, start_col))
+					matched = True
 					break
-			else:
-				# Single-char symbols
-				if ch in "+-*/%(){};,<>!=":
-					self._advance()
-					tokens.append(Token("SYMBOL", ch, start_line, start_col))
-					continue
+			if matched:
+				continue
+			if skim_bodies and ch == "{":
+				self._advance()
+				tokens.append(Token("BODY", self._skim_body(start_line, start_col), start_line, start_col + 1))
+				continue
+			# Single-char symbols
+			if ch in "+-*/%(){};,<>!=":
+				self._advance()
+				tokens.append(Token("SYMBOL", ch, start_line, start_col))
+				continue
 
 			m = NUMBER.match(self.source, self.index)
 			if m:
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+from .profile import PROFILE_WRITER
+
+
+# Functions provided by the C runtime that clang links in for us.
+RUNTIME_SYMBOLS = {"printf", "fopen", "fprintf", "fclose", "write"}
+
+DECLARE = re.compile(r"declare\s+[^@]*@([\w.$]+)\(")
+DEFINE = re.compile(r"define\s+[^@]*@([\w.$]+)\(")
+GLOBAL = re.compile(r"(@[\w.$]+)\s*=")
+CALL = re.compile(r"call\s+[^@]*@([\w.$]+)\(")
+METADATA = re.compile(r"!(\d+)")
+ATTRIBUTES = re.compile(r"attributes\s+#\d+\s*=")
+ATTRIBUTE_REF = re.compile(r"#(\d+)")
+TARGET = re.compile(r"(target\s+\w+)\s*=")
+LOCAL = re.compile(r"^(?:define|@[\w.$]+\s*=)\s+(?:internal|private)\s")
+
+
+class LinkError(ValueError):
+	def __init__(self, undefined: List[str], duplicates: List[str]) -> None:
+		self.undefined = undefined
+		self.duplicates = duplicates
+		parts = []
+		if undefined:
+			parts.append("undefined symbols: " + ", ".join(undefined))
+		if duplicates:
+			parts.append("duplicate symbols: " + ", ".join(duplicates))
+		super().__init__("; ".join(parts))
+
+
+@dataclass
+class Module:
+	name: str
+	declares: Dict[str, str] = field(default_factory=dict)
+	globals: Dict[str, str] = field(default_factory=dict)
+	defines: Dict[str, List[str]] = field(default_factory=dict)
+	calls: List[str] = field(default_factory=list)
+	metadata: List[str] = field(default_factory=list)
+	attributes: List[str] = field(default_factory=list)
+	targets: Dict[str, str] = field(default_factory=dict)
+
+
+def parse_module(name: str, text: str) -> Module:
+	mod = Module(name)
+	current: List[str] = []
+	for line in text.splitlines():
+		if current:
+			current.append(line)
+			m = CALL.search(line)
+			if m:
+				mod.calls.append(m.group(1))
+			if line == "}":
+				current = []
+			continue
+		if not line.strip() or line.lstrip().startswith(";") or line.startswith("source_filename"):
+			continue
+		m = DEFINE.match(line)
+		if m:
+			current = [line]
+			mod.defines[m.group(1)] = current
+			continue
+		m = DECLARE.match(line)
+		if m:
+			mod.declares[m.group(1)] = line
+			continue
+		m = GLOBAL.match(line)
+		if m:
+			mod.globals[m.group(1)] = line
+			continue
+		if METADATA.match(line):
+			mod.metadata.append(line)
+			continue
+		if ATTRIBUTES.match(line):
+			mod.attributes.append(line)
+			continue
+		m = TARGET.match(line)
+		if m:
+			mod.targets[m.group(1)] = line
+			continue
+		raise ValueError(f"{name}: unexpected top-level line {line!r}")
+	return mod
+
+
+def link_modules(modules: Iterable[Module]) -> str:
+	mods = list(modules)
+	_merge_profile_writers(mods)
+	_rename_local(mods)
+	defined: Dict[str, str] = {}
+	bodies: Dict[str, List[str]] = {}
+	duplicates: List[str] = []
+	for mod in mods:
+		for fname, body in list(mod.defines.items()):
+			if fname not in defined:
+				defined[fname] = mod.name
+			elif " linkonce_odr " in body[0] and body == bodies[fname]:
+				# identical runtime helper (print) emitted by several units
+				del mod.defines[fname]
+			else:
+				duplicates.append(f"@{fname} ({defined[fname]}, {mod.name})")
+			bodies.setdefault(fname, body)
+
+	# identical globals (the shared @.fmt constant) collapse to one copy
+	globals_: Dict[str, str] = {}
+	for mod in mods:
+		for gname, line in mod.globals.items():
+			if gname in globals_ and globals_[gname] != line:
+				duplicates.append(f"{gname} ({mod.name})")
+			globals_.setdefault(gname, line)
+
+	declares: Dict[str, str] = {}
+	for mod in mods:
+		for fname, line in mod.declares.items():
+			if fname not in defined:
+				declares.setdefault(fname, line)
+
+	undefined = sorted(
+		{f"@{fname}" for fname in declares if fname not in RUNTIME_SYMBOLS and not fname.startswith("llvm.")}
+		| {f"@{fname}" for mod in mods for fname in mod.calls if fname not in defined and fname not in declares}
+	)
+	if undefined or duplicates:
+		raise LinkError(undefined, duplicates)
+
+	targets: Dict[str, str] = {}
+	for mod in mods:
+		for key, line in mod.targets.items():
+			targets.setdefault(key, line)
+
+	# metadata ids (!0, !1, ...) and attribute groups (#0, #1, ...) are per
+	# module; shift each module's past the ones already taken
+	lines: List[str] = list(targets.values()) + list(declares.values()) + list(globals_.values())
+	metadata: List[str] = []
+	attributes: List[str] = []
+	for mod in mods:
+		md_offset = len(metadata)
+		attr_offset = len(attributes)
+
+		def shift(m: re.Match) -> str:
+			return f"!{int(m.group(1)) + md_offset}"
+
+		def shift_attr(m: re.Match) -> str:
+			return f"#{int(m.group(1)) + attr_offset}"
+
+		for body in mod.defines.values():
+			lines.extend(ATTRIBUTE_REF.sub(shift_attr, METADATA.sub(shift, line)) for line in body)
+		metadata.extend(METADATA.sub(shift, line) for line in mod.metadata)
+		attributes.extend(ATTRIBUTE_REF.sub(shift_attr, line) for line in mod.attributes)
+	lines.extend(attributes)
+	lines.extend(metadata)
+	return "\n".join(lines) + ("\n" if lines else "")
+
+
+def _merge_profile_writers(mods: List[Module]) -> None:
+	# every unit built with --profile-generate defines its own writer, while
+	# only main's dump calls one; give each writer a name of its own and make
+	# the dump call all of them so no unit's counters are lost
+	writers = []
+	for idx, mod in enumerate(mods):
+		if PROFILE_WRITER in mod.defines:
+			name = f"{PROFILE_WRITER}.{idx}"
+			_rename(mod, {PROFILE_WRITER: name})
+			writers.append(name)
+	call = re.compile(r"(\s*call void @)" + re.escape(PROFILE_WRITER) + r"\.\d+(\(.*)")
+	for mod in mods:
+		for body in mod.defines.values():
+			lines: List[str] = []
+			for line in body:
+				m = call.fullmatch(line)
+				lines.extend([f"{m.group(1)}{w}{m.group(2)}" for w in writers] if m else [line])
+			body[:] = lines
+
+
+def _rename_local(mods: List[Module]) -> None:
+	# internal and private symbols (ipcp clones, profile counters and strings)
+	# belong to their module, so a name clash is resolved by renaming the
+	# later copy within its own module. Identical constants (@.fmt) are kept
+	# as they are and merged by link_modules.
+	taken = set()
+	seen: Dict[str, str] = {}
+	for idx, mod in enumerate(mods):
+		renames = {
+			fname: f"{fname}.{idx}"
+			for fname, body in mod.defines.items()
+			if fname in taken and LOCAL.match(body[0])
+		}
+		renames.update(
+			(gname[1:], f"{gname[1:]}.{idx}")
+			for gname, line in mod.globals.items()
+			if seen.get(gname, line) != line and LOCAL.match(line)
+		)
+		taken.update(mod.defines)
+		for gname, line in mod.globals.items():
+			seen.setdefault(gname, line)
+		if not renames:
+			continue
+		_rename(mod, renames)
+		taken.update(renames.values())
+
+
+def _rename(mod: Module, renames: Dict[str, str]) -> None:
+	pattern = re.compile(r"@(" + "|".join(re.escape(f) for f in renames) + r")(?![\w.$])")
+
+	def rename(m: re.Match) -> str:
+		return f"@{renames[m.group(1)]}"
+
+	mod.defines = {renames.get(f, f): [pattern.sub(rename, line) for line in body] for f, body in mod.defines.items()}
+	mod.globals = {
+		"@" + renames.get(g[1:], g[1:]): pattern.sub(rename, line) for g, line in mod.globals.items()
+	}
+	mod.calls = [renames.get(f, f) for f in mod.calls]
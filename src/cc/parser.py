@@ -1,13 +1,15 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
+from .lexer import Lexer
 from .tokens import Token
 from .ast_nodes import (
 	Type,
 	VarDecl,
 	Param,
 	FunctionDecl,
+	LazyFunctionDecl,
 	Block,
 	IfStmt,
 	WhileStmt,
@@ -23,9 +25,13 @@ from .ast_nodes import (
 
 
 class Parser:
-	def __init__(self, tokens: List[Token]) -> None:
+	def __init__(self, tokens: List[Token], lazy: bool = False) -> None:
 		self.tokens = tokens
 		self.pos = 0
+		# lazy: skim function bodies by brace matching and parse each one
+		# only when its FunctionDecl.body is first read. Bodies that the lexer
+		# skimmed into BODY tokens are also tokenized only then.
+		self.lazy = lazy
 
 	def _peek(self, n: int = 0) -> Token:
 		if self.pos + n >= len(self.tokens):
@@ -53,8 +59,15 @@ class Parser:
 
 	def parse(self) -> List[FunctionDecl]:
 		functions: List[FunctionDecl] = []
+		# prototypes and the definition of a function must agree
+		signatures: Dict[str, Tuple[str, ...]] = {}
 		while self._peek().type != "EOF":
-			functions.append(self._function())
+			start = self._peek()
+			fn = self._function()
+			sig = (fn.return_type.name, *(p.type.name for p in fn.params))
+			if signatures.setdefault(fn.name, sig) != sig:
+				raise SyntaxError(f"Conflicting declaration of {fn.name} at {start.line}:{start.column}")
+			functions.append(fn)
 		return functions
 
 	def _type(self) -> Type:
@@ -71,23 +84,80 @@ class Parser:
 		raise SyntaxError(f"Expected identifier at {t.line}:{t.column}")
 
 	def _function(self) -> FunctionDecl:
+		self._match("extern")
 		ret = self._type()
 		name = self._ident()
 		self._expect("(", "Expected '('")
 		params: List[Param] = []
+		unnamed: Optional[Token] = None
+		# f(void) declares no parameters
+		if self._peek().lexeme == "void" and self._peek(1).lexeme == ")":
+			self._advance()
 		if not self._match(")"):
 			while True:
+				t = self._peek()
 				ptype = self._type()
-				pname = self._ident()
+				if ptype.name == "void":
+					raise SyntaxError(f"Parameter cannot be void at {t.line}:{t.column}")
+				# parameter names are optional in prototypes only
+				if self._peek().type == "IDENT":
+					pname = self._ident()
+				else:
+					unnamed = unnamed or self._peek()
+					pname = f"arg{len(params)}"
 				params.append(Param(ptype, pname))
 				if self._match(","):
 					continue
 				self._expect(")", "Expected ')'")
 				break
-		self._expect("{", "Expected '{'")
+		if self._match(";"):
+			return FunctionDecl(ret, name, params, None)
+		if unnamed is not None:
+			raise SyntaxError(f"Expected identifier at {unnamed.line}:{unnamed.column}")
+		if self._peek().type == "BODY":
+			text = self._advance()
+			if self.lazy:
+				return LazyFunctionDecl(ret, name, params, lambda: self._parse_body_text(text))
+			return FunctionDecl(ret, name, params, self._parse_body_text(text))
+		brace = self._expect("{", "Expected '{'")
+		if self.lazy:
+			start = self.pos
+			self._skim_block(brace)
+			return LazyFunctionDecl(ret, name, params, lambda: self._parse_body(start))
 		body = self._block()
 		return FunctionDecl(ret, name, params, body)
 
+	def _skim_block(self, brace: Token) -> None:
+		# called just after '{'; stops after the matching '}'
+		depth = 1
+		tokens = self.tokens
+		for i in range(self.pos, len(tokens)):
+			t = tokens[i]
+			if t.type != "SYMBOL":
+				continue
+			if t.lexeme == "{":
+				depth += 1
+			elif t.lexeme == "}":
+				depth -= 1
+				if depth == 0:
+					self.pos = i + 1
+					return
+		raise SyntaxError(f"Unmatched '{{' at {brace.line}:{brace.column}")
+
+	def _parse_body(self, start: int) -> Block:
+		saved = self.pos
+		self.pos = start
+		try:
+			return self._block()
+		finally:
+			self.pos = saved
+
+	def _parse_body_text(self, text: Token) -> Block:
+		# a BODY token from Lexer.tokenize(skim_bodies=True); its position is
+		# that of the first character after '{'
+		tokens = Lexer(text.lexeme, text.line, text.column).tokenize()
+		return Parser(tokens)._block()
+
 	def _block(self) -> Block:
 		stmts: List = []
 		while not self._match("}"):
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# Profile format (JSON), written by programs built with --profile-generate and
+# read back by --profile-use:
+#
+#   {
+#     "version": 1,
+#     "counters": {
+#       "main:entry": 1,
+#       "main:if0.then": 1,
+#       "main:if0.else": 0,
+#       "main:while1.body": 7,
+#       "main:while1.exit": 1,
+#       "run:switch0.case3": 12,
+#       "run:switch0.default": 0
+#     }
+#   }
+#
+# Keys are "<function>:<site>". Sites are numbered per function in source
+# order (if, while and switch statements share one sequence) and are:
+#   entry                      calls of the function
+#   if<N>.then / if<N>.else    times the condition was true / false
+#   while<N>.body / .exit      loop iterations / times the loop was left
+#   switch<N>.case<K> / .default
+# Missing keys mean "unknown"; hand-written profiles may list only the sites
+# they care about. Site numbers depend on the passes that ran (--ipcp removes
+# constant if/while statements), so use the same --tre/--switch-threshold/--ipcp
+# flags for both builds.
+
+PROFILE_VERSION = 1
+DEFAULT_PROFILE_PATH = "ccmini.profile.json"
+
+# Each instrumented unit defines this function to append its counters to the
+# profile being written; `ccmini link` makes main's dump call every unit's.
+PROFILE_WRITER = ".prof.write"
+
+# functions entered at least this fraction as often as the hottest one get
+# an inline hint
+HOT_FRACTION = 0.1
+
+
+@dataclass
+class Profile:
+	counters: Dict[str, int] = field(default_factory=dict)
+
+	def count(self, fn: str, site: str) -> Optional[int]:
+		return self.counters.get(f"{fn}:{site}")
+
+	def max_entry(self) -> int:
+		entries = [v for k, v in self.counters.items() if k.endswith(":entry")]
+		return max(entries, default=0)
+
+	def is_hot(self, fn: str) -> bool:
+		n = self.count(fn, "entry")
+		top = self.max_entry()
+		return n is not None and top > 0 and n >= top * HOT_FRACTION
+
+	def is_cold(self, fn: str) -> bool:
+		return self.count(fn, "entry") == 0
+
+
+def load_profile(path: Path) -> Profile:
+	data = json.loads(Path(path).read_text(encoding="utf-8"))
+	if not isinstance(data, dict) or data.get("version") != PROFILE_VERSION:
+		raise ValueError(f"{path}: unsupported profile version")
+	counters = data.get("counters", {})
+	if not isinstance(counters, dict) or not all(isinstance(v, int) for v in counters.values()):
+		raise ValueError(f"{path}: counters must map site names to integers")
+	return Profile(dict(counters))
+
+
+def branch_weights(counts: List[int]) -> List[int]:
+	# LLVM branch weights are i32; scale large counts down keeping the ratio
+	top = max(counts, default=0)
+	limit = 0xFFFFFFFF
+	if top <= limit:
+		return list(counts)
+	return [c * limit // top for c in counts]
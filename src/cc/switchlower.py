@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+from .ast_nodes import *  # noqa: F401,F403
+
+
+# Replaces chains of `if (x == K1) {..} else { if (x == K2) {..} else {..} }`
+# with at least `threshold` distinct constants by a SwitchStmt. Returns the
+# number of chains lowered.
+def lower_switches(functions: List[FunctionDecl], threshold: int = 4) -> int:
+	count = 0
+	for fn in functions:
+		if fn.body is not None:
+			count += _lower_block(fn.body, threshold)
+	return count
+
+
+def _constant(e: Expr) -> Optional[int]:
+	if isinstance(e, Number):
+		return e.value
+	if isinstance(e, Unary) and e.op == "-" and isinstance(e.value, Number):
+		return -e.value.value
+	return None
+
+
+def _case(cond: Expr) -> Optional[Tuple[str, int]]:
+	# x == K or K == x
+	if not isinstance(cond, Binary) or cond.op != "==":
+		return None
+	for var, k in ((cond.left, cond.right), (cond.right, cond.left)):
+		value = _constant(k)
+		if isinstance(var, Var) and value is not None:
+			return var.name, value
+	return None
+
+
+def _collect(st: IfStmt) -> Optional[SwitchStmt]:
+	first = _case(st.cond)
+	if first is None:
+		return None
+	name = first[0]
+	cases: List[Tuple[int, Block]] = []
+	seen = set()
+	cur: Optional[Block] = Block([st])
+	while cur is not None and len(cur.statements) == 1 and isinstance(cur.statements[0], IfStmt):
+		nested = cur.statements[0]
+		case = _case(nested.cond)
+		# a repeated constant could never match again; leave it to the default
+		if case is None or case[0] != name or case[1] in seen:
+			break
+		seen.add(case[1])
+		cases.append((case[1], nested.then_block))
+		cur = nested.else_block
+	return SwitchStmt(Var(name), cases, cur)
+
+
+def _lower_block(block: Block, threshold: int) -> int:
+	count = 0
+	for i, st in enumerate(block.statements):
+		if isinstance(st, IfStmt):
+			sw = _collect(st)
+			if sw is not None and len(sw.cases) >= threshold:
+				block.statements[i] = sw
+				count += 1
+				for _, b in sw.cases:
+					count += _lower_block(b, threshold)
+				if sw.default:
+					count += _lower_block(sw.default, threshold)
+				continue
+			count += _lower_block(st.then_block, threshold)
+			if st.else_block:
+				count += _lower_block(st.else_block, threshold)
+		elif isinstance(st, WhileStmt):
+			count += _lower_block(st.body, threshold)
+	return count
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from .ast_nodes import *  # noqa: F401,F403
+
+
+# Rewrites `return f(args);` (and `f(args);` right before a void return) inside
+# f into TailJump statements. Returns the number of calls rewritten.
+def eliminate_tail_recursion(functions: List[FunctionDecl]) -> int:
+	count = 0
+	for fn in functions:
+		if fn.body is None:
+			continue
+		count += _rewrite_block(fn, fn.body, fn.return_type.name == "void")
+	return count
+
+
+def has_tail_jump(block: Block) -> bool:
+	for st in block.statements:
+		if isinstance(st, TailJump):
+			return True
+		if isinstance(st, IfStmt):
+			if has_tail_jump(st.then_block):
+				return True
+			if st.else_block and has_tail_jump(st.else_block):
+				return True
+		if isinstance(st, WhileStmt) and has_tail_jump(st.body):
+			return True
+		if isinstance(st, SwitchStmt):
+			if any(has_tail_jump(b) for _, b in st.cases):
+				return True
+			if st.default and has_tail_jump(st.default):
+				return True
+	return False
+
+
+def _is_self_call(fn: FunctionDecl, e: Optional[Expr]) -> bool:
+	return isinstance(e, Call) and e.name == fn.name and len(e.args) == len(fn.params)
+
+
+def _rewrite_block(fn: FunctionDecl, block: Block, at_tail: bool) -> int:
+	# at_tail: falling off the end of this block returns from the function
+	count = 0
+	stmts = block.statements
+	for i, st in enumerate(stmts):
+		if i + 1 < len(stmts):
+			nxt = stmts[i + 1]
+			tail = isinstance(nxt, ReturnStmt) and nxt.value is None
+		else:
+			tail = at_tail
+		if isinstance(st, ReturnStmt) and _is_self_call(fn, st.value):
+			stmts[i] = TailJump(st.value.args)  # type: ignore[union-attr]
+			count += 1
+		elif tail and isinstance(st, ExprStmt) and _is_self_call(fn, st.expr):
+			stmts[i] = TailJump(st.expr.args)  # type: ignore[union-attr]
+			count += 1
+		elif isinstance(st, IfStmt):
+			count += _rewrite_block(fn, st.then_block, tail)
+			if st.else_block:
+				count += _rewrite_block(fn, st.else_block, tail)
+		elif isinstance(st, WhileStmt):
+			count += _rewrite_block(fn, st.body, False)
+		elif isinstance(st, SwitchStmt):
+			for _, b in st.cases:
+				count += _rewrite_block(fn, b, tail)
+			if st.default:
+				count += _rewrite_block(fn, st.default, tail)
+	return count
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+
+import pytest
+
+from cc.ast_nodes import Assign, Call, ExprStmt, Number, ReturnStmt, VarDecl
+from cc.callgraph import iter_calls
+from cc.codegen import Codegen
+from cc.ipcp import propagate_constants
+from cc.lexer import Lexer
+from cc.parser import Parser
+
+
+def parse(source):
+	return Parser(Lexer(source).tokenize()).parse()
+
+
+def by_name(funcs):
+	return {fn.name: fn for fn in funcs}
+
+
+def calls(fn):
+	return [c.name for c in iter_calls(fn.body)]
+
+
+def run(tmp_path, funcs):
+	if shutil.which("lli") is None:
+		pytest.skip("lli not available")
+	ll = tmp_path / "program.ll"
+	ll.write_text(Codegen().generate(funcs), encoding="utf-8")
+	return subprocess.run(["lli", str(ll)]).returncode
+
+
+def test_folds_pure_call_with_constant_arguments():
+	funcs = parse("int add(int a, int b) { return a + b; }\nint main() { return add(2, 40); }")
+	stats = propagate_constants(funcs)
+	assert (stats.folded, stats.specialized, stats.clones) == (1, 0, 0)
+	assert by_name(funcs)["main"].body.statements == [ReturnStmt(Number(42))]
+
+
+def test_step_budget_stops_long_loops():
+	source = """
+int spin(int n) {
+	int i;
+	i = 0;
+	while (i < n) {
+		i = i + 1;
+	}
+	return i;
+}
+int main() {
+	return spin(3) + spin(1000000);
+}
+"""
+	funcs = parse(source)
+	stats = propagate_constants(funcs)
+	# the long call is left alone, then specialized as its only remaining site
+	assert (stats.folded, stats.specialized, stats.clones) == (1, 1, 1)
+	(ret,) = by_name(funcs)["main"].body.statements
+	assert ret.value.left == Number(3)
+	assert ret.value.right == Call("spin.spec0", [])
+
+	funcs = parse(source)
+	assert propagate_constants(funcs, budget=5).folded == 0
+	assert calls(by_name(funcs)["main"]) == ["spin", "spin"]
+
+
+@pytest.mark.parametrize(
+	"source",
+	[
+		"int fact(int n) { if (n < 2) { return 1; } return n * fact(n - 1); }\nint main() { return fact(5); }",
+		"int noisy(int x) { print(x); return x; }\nint main() { return noisy(3); }",
+		"int ext(int x);\nint twice(int x) { return ext(x) * 2; }\nint main() { return twice(3); }",
+	],
+)
+def test_does_not_fold_recursive_or_impure_calls(source):
+	funcs = parse(source)
+	stats = propagate_constants(funcs)
+	assert stats.folded == 0
+	# the call may be redirected to a clone, but it stays a call
+	(ret,) = by_name(funcs)["main"].body.statements
+	assert isinstance(ret.value, Call)
+
+
+PW = """
+int pw(int b, int e) {
+	if (e == 0) {
+		return 1;
+	}
+	return b * pw(b, e - 1);
+}
+int main() {
+	int n;
+	n = 3;
+	return pw(2, n) + pw(2, n + 1);
+}
+"""
+
+
+def test_specializes_parameter_constant_at_every_call_site(tmp_path):
+	funcs = parse(PW)
+	stats = propagate_constants(funcs)
+	fns = by_name(funcs)
+	clone = fns["pw.spec0"]
+	assert clone.internal and [p.name for p in clone.params] == ["e"]
+	# the recursive call hands b through unchanged, so it agrees with main's 2s
+	# and the clone calls itself
+	assert calls(fns["main"]) == ["pw.spec0", "pw.spec0"]
+	assert calls(clone) == ["pw.spec0"]
+	assert calls(fns["pw"]) == ["pw"]
+	assert (stats.folded, stats.specialized, stats.clones) == (0, 3, 1)
+	assert len(funcs) == 3
+	assert run(tmp_path, funcs) == run(tmp_path, parse(PW)) == 24
+
+
+def test_no_clone_when_call_sites_disagree():
+	funcs = parse(PW.replace("pw(2, n + 1)", "pw(3, n + 1)"))
+	stats = propagate_constants(funcs)
+	assert (stats.specialized, stats.clones) == (0, 0)
+	assert [fn.name for fn in funcs] == ["pw", "main"]
+
+
+def test_written_parameter_gets_a_prologue_local():
+	source = """
+int bump(int a, int b) {
+	a = a + b;
+	return a;
+}
+int main() {
+	int x;
+	x = 5;
+	return bump(7, x) + bump(7, x + 1);
+}
+"""
+	funcs = parse(source)
+	stats = propagate_constants(funcs)
+	assert (stats.specialized, stats.clones) == (2, 1)
+	clone = by_name(funcs)["bump.spec0"]
+	assert [p.name for p in clone.params] == ["b"]
+	decl, init = clone.body.statements[:2]
+	assert decl == VarDecl(decl.type, "a")
+	assert init == ExprStmt(Assign("a", Number(7)))
+
+
+def test_logical_and_compares_each_operand(tmp_path):
+	ll = Codegen().generate(parse("int main() { return 2 && 1 == 1; }"))
+	assert "and i1" in ll
+	assert run(tmp_path, parse("int main() { return 2 && 1 == 1; }")) == 1
+	assert run(tmp_path, parse("int main() { return 2 && 1; }")) == 1
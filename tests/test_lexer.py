@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import pytest
+
+from cc.lexer import Lexer
+
+
+def lexemes(source):
+	return [(t.type, t.lexeme) for t in Lexer(source).tokenize()]
+
+
+@pytest.mark.parametrize("op", ["==", "!=", "<=", ">=", "&&", "||"])
+def test_two_character_operators_with_spaces(op):
+	assert lexemes(f"a {op} b") == [("IDENT", "a"), ("SYMBOL", op), ("IDENT", "b")]
+	assert lexemes(f"a{op}b") == [("IDENT", "a"), ("SYMBOL", op), ("IDENT", "b")]
+
+
+def test_operator_followed_by_number_and_newline():
+	tokens = Lexer("if (x == 1\n)").tokenize()
+	assert [t.lexeme for t in tokens] == ["if", "(", "x", "==", "1", ")"]
+	assert (tokens[3].line, tokens[3].column) == (1, 7)
+	assert (tokens[5].line, tokens[5].column) == (2, 1)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+
+import pytest
+
+from cc.codegen import Codegen
+from cc.lexer import Lexer
+from cc.linker import link_modules, parse_module
+from cc.parser import Parser
+from cc.profile import load_profile
+
+
+MAIN = """
+int other(int x);
+int main() {
+	int i;
+	int s;
+	i = 0;
+	s = 0;
+	while (i < 5) {
+		s = s + other(i);
+		i = i + 1;
+	}
+	return s;
+}
+"""
+
+OTHER = """
+int other(int x) {
+	if (x > 2) {
+		return x * 2;
+	}
+	return x;
+}
+"""
+
+
+def compile_unit(source, **options):
+	return Codegen(**options).generate(Parser(Lexer(source).tokenize()).parse())
+
+
+def test_profile_generate_link_round_trip(tmp_path):
+	path = tmp_path / "profile.json"
+	units = [("main.ll", MAIN), ("other.ll", OTHER)]
+	linked = link_modules(parse_module(name, compile_unit(src, profile_generate=str(path))) for name, src in units)
+
+	assert linked.count("define private void @.prof.dump()") == 1
+	writers = [line.split("@")[1].split("(")[0] for line in linked.splitlines() if line.startswith("  call void @.prof.write")]
+	assert len(writers) == 2 and len(set(writers)) == 2
+
+	if shutil.which("lli") is None:
+		pytest.skip("lli not available")
+	ll = tmp_path / "program.ll"
+	ll.write_text(linked, encoding="utf-8")
+	assert subprocess.run(["lli", str(ll)]).returncode == 17
+	profile = load_profile(path)
+	assert profile.count("main", "entry") == 1
+	assert profile.count("main", "while0.body") == 5
+	assert profile.count("other", "entry") == 5
+	assert profile.count("other", "if0.then") == 2
+	assert profile.count("other", "if0.else") == 3
+
+
+def test_main_flushes_output_of_other_units(tmp_path):
+	units = [("main.ll", "int main() { return other(4); }"), ("other.ll", "int other(int x) { print(x * 10); return 3; }")]
+	linked = link_modules(parse_module(name, compile_unit(src)) for name, src in units)
+	assert "  call void @.print.flush()" in linked.split("define i32 @other(")[0]
+
+	if shutil.which("lli") is None:
+		pytest.skip("lli not available")
+	ll = tmp_path / "program.ll"
+	ll.write_text(linked, encoding="utf-8")
+	run = subprocess.run(["lli", str(ll)], capture_output=True, text=True)
+	assert (run.returncode, run.stdout) == (3, "40\n")
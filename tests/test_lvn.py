@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import pytest
+
+from cc.codegen import Codegen
+from cc.lexer import Lexer
+from cc.parser import Parser
+
+
+def compile_ir(source, lvn=True):
+	cg = Codegen(lvn=lvn)
+	ll = cg.generate(Parser(Lexer(source).tokenize()).parse())
+	return cg, ll
+
+
+def body(ll, name):
+	lines = ll.splitlines()
+	start = next(i for i, line in enumerate(lines) if line.startswith("define") and f"@{name}(" in line)
+	end = lines.index("}", start)
+	return lines[start + 1 : end]
+
+
+def count(lines, text):
+	return sum(text in line for line in lines)
+
+
+def test_repeated_expression_is_computed_once():
+	_, ll = compile_ir("int f(int a, int b) { return (a + b) * (a + b); }")
+	lines = body(ll, "f")
+	assert count(lines, " = add i32 ") == 1
+	assert count(lines, " = mul i32 ") == 1
+	_, ll = compile_ir("int f(int a, int b) { return (a + b) * (b + a); }")
+	assert count(body(ll, "f"), " = add i32 ") == 1
+
+
+def test_store_is_forwarded_to_later_load():
+	_, ll = compile_ir("int f(int a) { int x; x = a + 1; return x * 2; }")
+	lines = body(ll, "f")
+	assert count(lines, " = load ") == 0
+	(add,) = [line for line in lines if " = add i32 " in line]
+	assert f"mul i32 {add.split()[0]}, 2" in "\n".join(lines)
+
+
+def test_call_drops_memory_facts():
+	_, ll = compile_ir("int g();\nint f(int a) { int x; x = a; g(); return x; }")
+	lines = body(ll, "f")
+	call = next(i for i, line in enumerate(lines) if "call i32 @g()" in line)
+	assert count(lines[:call], " = load ") == 0
+	assert count(lines[call:], " = load ") == 1
+
+
+def test_labels_drop_all_facts():
+	source = "int f(int a, int b) { int x; x = a + b; if (a) { return (a + b) + x; } return x; }"
+	_, ll = compile_ir(source)
+	lines = body(ll, "f")
+	blocks = []
+	for line in lines:
+		if line.endswith(":"):
+			blocks.append([])
+		else:
+			blocks[-1].append(line)
+	entry, then, end = blocks
+	assert count(entry, " = add i32 ") == 1
+	# a + b is recomputed and a, b and x are reloaded in the new blocks
+	assert count(then, " = add i32 ") == 2
+	assert count(then, " = load ") == 3
+	assert count(end, " = load ") == 1
+
+
+@pytest.mark.parametrize(
+	"source",
+	[
+		"int f(int a, int b) { return (a + b) * (a + b) - -a * -a; }",
+		"int f(int a) { int x; x = a; x = x + x; while (x < 100) { x = x * 2 + x * 2; } return x + x; }",
+		"int g(int v);\nint f(int a) { int x; x = !a; g(x); return !a + x + g(!a); }",
+	],
+)
+def test_eliminated_count_matches_removed_instructions(source):
+	cg, with_lvn = compile_ir(source)
+	_, without = compile_ir(source, lvn=False)
+	removed = len(without.splitlines()) - len(with_lvn.splitlines())
+	assert removed > 0
+	assert cg.lvn_eliminated == removed
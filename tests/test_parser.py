@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import pytest
+
+from cc.callgraph import reachable
+from cc.lexer import Lexer
+from cc.parser import Parser
+
+
+def parse(source, lazy=False):
+	return Parser(Lexer(source).tokenize(skim_bodies=lazy), lazy=lazy).parse()
+
+
+def test_void_parameter_list_is_empty():
+	g, main = parse("int g(void);\nint main(void) { return g(); }")
+	assert g.params == [] and g.body is None
+	assert main.params == []
+
+
+@pytest.mark.parametrize("source", ["int g(void x);", "int g(int a, void);", "int g(void, int a);"])
+def test_void_parameter_is_rejected(source):
+	with pytest.raises(SyntaxError, match="void"):
+		parse(source)
+
+
+def test_prototype_must_match_definition():
+	with pytest.raises(SyntaxError, match="Conflicting declaration of g"):
+		parse("int g(int a);\nint g(int b, int c) { return b; }")
+	with pytest.raises(SyntaxError, match="Conflicting declaration of g"):
+		parse("void g(int a);\nint g(int b) { return b; }")
+	proto, defn = parse("int g(int);\nint g(int b) { return b; }")
+	assert [p.name for p in defn.params] == ["b"]
+
+
+def test_unnamed_parameters_only_in_prototypes():
+	(g,) = parse("int g(int, int);")
+	assert [p.name for p in g.params] == ["arg0", "arg1"]
+	with pytest.raises(SyntaxError, match="Expected identifier"):
+		parse("int f(int) { return 0; }")
+
+
+LAZY_SOURCE = """int used(int x) {
+	// a comment with a stray }
+	return x + 1;
+}
+int unused(int x) {
+	/* } { */
+	return x @ 2;
+}
+int main() {
+	return used(4);
+}
+"""
+
+
+def test_lazy_parse_leaves_unreached_bodies_unparsed():
+	funcs = parse(LAZY_SOURCE, lazy=True)
+	assert [f.name for f in funcs] == ["used", "unused", "main"]
+	assert not any(f.parsed for f in funcs)
+	kept = reachable(funcs, ["main"])
+	assert [f.name for f in kept] == ["used", "main"]
+	assert all(f.parsed for f in kept)
+	# never tokenized either, or the '@' would have been an error
+	assert not funcs[1].parsed
+
+
+def test_lazy_parse_matches_eager_parse():
+	source = LAZY_SOURCE.replace("x @ 2", "x * 2")
+	eager = parse(source)
+	lazy = parse(source, lazy=True)
+	assert [f.body for f in lazy] == [f.body for f in eager]
+
+
+def test_lazy_parse_reports_errors_in_reached_bodies():
+	funcs = parse("int main() {\n\tint x;\n\tx = ;\n}\n", lazy=True)
+	with pytest.raises(SyntaxError, match="line=3, col=6"):
+		funcs[0].body
+
+
+def test_lazy_parse_reports_unmatched_brace():
+	with pytest.raises(SyntaxError, match="Unmatched '\\{' at 1:12"):
+		parse("int main() { return 0;\n", lazy=True)
+
+
+def test_reachable_rejects_unknown_roots():
+	funcs = parse(LAZY_SOURCE, lazy=True)
+	with pytest.raises(ValueError, match="mian"):
+		reachable(funcs, ["main", "mian"])
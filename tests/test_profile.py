@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import json
+import re
+
+import pytest
+
+from cc.codegen import Codegen
+from cc.lexer import Lexer
+from cc.parser import Parser
+from cc.profile import load_profile
+
+
+SOURCE = """
+int helper(int x) {
+	if (x > 2) {
+		return x * 2;
+	} else {
+		return x;
+	}
+}
+int unused(int x) {
+	return x;
+}
+int main() {
+	return helper(5);
+}
+"""
+
+
+def compile_with(tmp_path, counters):
+	path = tmp_path / "profile.json"
+	path.write_text(json.dumps({"version": 1, "counters": counters}), encoding="utf-8")
+	funcs = Parser(Lexer(SOURCE).tokenize()).parse()
+	return Codegen(profile=load_profile(path)).generate(funcs)
+
+
+def metadata(ll):
+	return dict(re.findall(r"^(!\d+) = (.*)$", ll, re.M))
+
+
+def function_line(ll, name):
+	return next(line for line in ll.splitlines() if line.startswith("define") and f"@{name}(" in line)
+
+
+def test_branch_weights_and_entry_count(tmp_path):
+	ll = compile_with(tmp_path, {"helper:entry": 11, "helper:if0.then": 2, "helper:if0.else": 9})
+	md = metadata(ll)
+	br = next(line for line in ll.splitlines() if line.startswith("  br i1"))
+	assert md[br.rsplit("!prof ", 1)[1]] == '!{!"branch_weights", i32 2, i32 9}'
+	entry = function_line(ll, "helper").rsplit("!prof ", 1)[1].rstrip(" {")
+	assert md[entry] == '!{!"function_entry_count", i64 11}'
+
+
+def test_hotter_arm_first(tmp_path):
+	ll = compile_with(tmp_path, {"helper:if0.then": 2, "helper:if0.else": 9})
+	assert re.search(r"^else\d+:", ll, re.M).start() < re.search(r"^then\d+:", ll, re.M).start()
+	ll = compile_with(tmp_path, {"helper:if0.then": 9, "helper:if0.else": 2})
+	assert re.search(r"^then\d+:", ll, re.M).start() < re.search(r"^else\d+:", ll, re.M).start()
+
+
+def test_hot_and_cold_attributes(tmp_path):
+	ll = compile_with(tmp_path, {"main:entry": 1, "helper:entry": 100, "unused:entry": 0})
+	assert " inlinehint " in function_line(ll, "helper")
+	assert " cold " in function_line(ll, "unused")
+	main = function_line(ll, "main")
+	assert " inlinehint " not in main and " cold " not in main
+
+
+def test_no_profile_data_leaves_functions_alone(tmp_path):
+	ll = compile_with(tmp_path, {})
+	assert "!prof" not in ll
+
+
+@pytest.mark.parametrize(
+	"data",
+	[
+		{"version": 2, "counters": {}},
+		{"counters": {"main:entry": 1}},
+		{"version": 1, "counters": {"main:entry": "1"}},
+		{"version": 1, "counters": {"main:entry": 1.5}},
+		{"version": 1, "counters": [1]},
+	],
+)
+def test_load_profile_rejects_bad_data(tmp_path, data):
+	path = tmp_path / "profile.json"
+	path.write_text(json.dumps(data), encoding="utf-8")
+	with pytest.raises(ValueError):
+		load_profile(path)
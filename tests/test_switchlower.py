@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+import re
+
+from cc.ast_nodes import IfStmt, SwitchStmt
+from cc.codegen import Codegen
+from cc.lexer import Lexer
+from cc.parser import Parser
+from cc.profile import load_profile
+from cc.switchlower import lower_switches
+
+
+def chain(subject, constants, default="return 0;"):
+	# if (x == K0) { return 10; } else { if (x == K1) { ... } else { default } }
+	source = default
+	for i, k in reversed(list(enumerate(constants))):
+		source = f"if ({subject(k)}) {{ return {10 + i}; }} else {{ {source} }}"
+	return source
+
+
+def lowered(body, threshold=4):
+	(fn,) = Parser(Lexer(f"int f(int x, int y) {{ {body} }}").tokenize()).parse()
+	count = lower_switches([fn], threshold)
+	return fn, count
+
+
+def test_lowers_at_threshold_only():
+	fn, count = lowered(chain(lambda k: f"x == {k}", [1, 2, 3, 4]))
+	assert count == 1
+	(sw,) = fn.body.statements
+	assert isinstance(sw, SwitchStmt) and sw.subject.name == "x"
+	assert [k for k, _ in sw.cases] == [1, 2, 3, 4]
+	fn, count = lowered(chain(lambda k: f"x == {k}", [1, 2, 3]))
+	assert count == 0 and isinstance(fn.body.statements[0], IfStmt)
+	fn, count = lowered(chain(lambda k: f"x == {k}", [1, 2, 3]), threshold=3)
+	assert count == 1
+
+
+def test_constant_on_the_left_and_negative_constants():
+	fn, count = lowered(chain(lambda k: f"{k} == x" if k % 2 else f"x == {k}", [-7, 2, -3, 9]))
+	assert count == 1
+	assert [k for k, _ in fn.body.statements[0].cases] == [-7, 2, -3, 9]
+
+
+def test_repeated_constant_ends_the_chain():
+	fn, _ = lowered(chain(lambda k: f"x == {k}", [1, 2, 3, 4, 2, 5]))
+	(sw,) = fn.body.statements
+	assert [k for k, _ in sw.cases] == [1, 2, 3, 4]
+	# the second x == 2 can never be true there, but stays in the default
+	(rest,) = sw.default.statements
+	assert isinstance(rest, IfStmt) and rest.cond.right.value == 2
+
+
+def test_chain_on_another_variable_is_not_merged():
+	inner = chain(lambda k: f"y == {k}", [5, 6, 7, 8])
+	fn, count = lowered(chain(lambda k: f"x == {k}", [1, 2, 3, 4], default=inner))
+	assert count == 2
+	(sw,) = fn.body.statements
+	assert sw.subject.name == "x" and [k for k, _ in sw.cases] == [1, 2, 3, 4]
+	(inner_sw,) = sw.default.statements
+	assert inner_sw.subject.name == "y" and [k for k, _ in inner_sw.cases] == [5, 6, 7, 8]
+
+
+def test_switch_ir_and_branch_weight_order(tmp_path):
+	fn, _ = lowered(chain(lambda k: f"x == {k}", [1, -2, 3, 4]))
+	path = tmp_path / "profile.json"
+	counters = {"f:switch0.default": 5, "f:switch0.case1": 1, "f:switch0.case-2": 2, "f:switch0.case3": 3}
+	path.write_text(json.dumps({"version": 1, "counters": counters}), encoding="utf-8")
+	ll = Codegen(profile=load_profile(path)).generate([fn])
+	m = re.search(r"switch i32 (%t\d+), label %(default\d+) \[ (.*) \], !prof (!\d+)", ll)
+	assert m is not None
+	targets = re.findall(r"i32 (-?\d+), label %case\d+", m.group(3))
+	assert targets == ["1", "-2", "3", "4"]
+	# default first, then the cases in order; unknown counts become 0
+	assert f'{m.group(4)} = !{{!"branch_weights", i32 5, i32 1, i32 2, i32 3, i32 0}}' in ll
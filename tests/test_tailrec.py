@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+
+import pytest
+
+from cc.ast_nodes import Call, ExprStmt, IfStmt, ReturnStmt, TailJump, WhileStmt
+from cc.codegen import Codegen
+from cc.lexer import Lexer
+from cc.parser import Parser
+from cc.tailrec import eliminate_tail_recursion
+
+
+GCD = """
+int gcd(int a, int b) {
+	if (b == 0) {
+		return a;
+	}
+	return gcd(b, a % b);
+}
+int main() {
+	return gcd(1071, 462);
+}
+"""
+
+
+def parse(source):
+	return Parser(Lexer(source).tokenize()).parse()
+
+
+def test_return_of_self_call_becomes_tail_jump():
+	gcd, main = parse(GCD)
+	assert eliminate_tail_recursion([gcd, main]) == 1
+	last = gcd.body.statements[-1]
+	assert isinstance(last, TailJump) and len(last.args) == 2
+	assert isinstance(main.body.statements[-1], ReturnStmt)
+
+
+def test_void_self_call_before_return_becomes_tail_jump():
+	source = """
+void count(int n) {
+	if (n > 0) {
+		count(n - 1);
+		return;
+	}
+	count(0 - n);
+}
+"""
+	(count,) = parse(source)
+	assert eliminate_tail_recursion([count]) == 2
+	branch, last = count.body.statements
+	assert isinstance(branch.then_block.statements[0], TailJump)
+	assert isinstance(last, TailJump)
+
+
+def test_calls_that_are_not_in_tail_position_stay_calls():
+	source = """
+int f(int n) {
+	while (n > 0) {
+		f(n - 1);
+		n = n - 1;
+	}
+	if (n < 0) {
+		return f(n + 1) + 1;
+	}
+	f(n);
+	return 0;
+}
+"""
+	(f,) = parse(source)
+	assert eliminate_tail_recursion([f]) == 0
+	loop, branch, call, _ = f.body.statements
+	assert isinstance(loop, WhileStmt) and isinstance(loop.body.statements[0], ExprStmt)
+	assert isinstance(branch, IfStmt) and isinstance(branch.then_block.statements[0], ReturnStmt)
+	assert isinstance(call, ExprStmt) and isinstance(call.expr, Call)
+
+
+def test_tail_jump_evaluates_all_arguments_before_storing():
+	funcs = parse(GCD)
+	eliminate_tail_recursion(funcs)
+	lines = Codegen().generate(funcs).splitlines()
+	# the last branch back to the loop header is the rewritten call
+	jump = max(i for i, line in enumerate(lines) if line.startswith("  br label %tailrecurse"))
+	stores = [i for i in range(jump) if lines[i].startswith("  store i32 ")][-2:]
+	assert stores == [jump - 2, jump - 1]
+	srem = next(i for i in range(jump, 0, -1) if " = srem i32 " in lines[i])
+	assert srem < stores[0]
+	# a % b reads both parameters before b is overwritten with it
+	assert all(" = load " not in line for line in lines[stores[0] : jump])
+	assert not any("call i32 @gcd(" in line for line in lines[:jump])
+
+
+def test_tail_calls_flag_marks_calls():
+	funcs = parse(GCD)
+	plain = Codegen().generate(funcs)
+	marked = Codegen(tail_calls=True).generate(funcs)
+	assert "= call i32 @gcd(i32 1071, i32 462)" in plain
+	assert "= tail call i32 @gcd(i32 1071, i32 462)" in marked
+	assert " tail call " not in plain
+
+
+def test_deep_tail_recursion_runs(tmp_path):
+	if shutil.which("lli") is None:
+		pytest.skip("lli not available")
+	source = "int down(int n, int acc) { if (n == 0) { return acc % 256; } return down(n - 1, acc + 1); }\n"
+	source += "int main() { return down(10000000, 7); }"
+	funcs = parse(source)
+	eliminate_tail_recursion(funcs)
+	ll = tmp_path / "program.ll"
+	ll.write_text(Codegen().generate(funcs), encoding="utf-8")
+	assert subprocess.run(["lli", str(ll)]).returncode == (10000007 % 256)